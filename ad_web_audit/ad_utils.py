@@ -1,19 +1,24 @@
-﻿from ldap3 import Server, Connection, ALL, NTLM
-from ldap3.core.exceptions import LDAPSocketOpenError
-from config import DC_IP as DEFAULT_IP, LDAP_USER as DEFAULT_USER, PASSWORD as DEFAULT_PASS, BASE_DN as DEFAULT_DN
+﻿from config import DC_IP as DEFAULT_IP, LDAP_USER as DEFAULT_USER, PASSWORD as DEFAULT_PASS, BASE_DN as DEFAULT_DN
 from datetime import datetime, timedelta
+from metrics_utils import span, record_ldap_usage
 
 def connect_to_ad(override=None):
     dc_ip = override['DC_IP'] if override else DEFAULT_IP
     ldap_user = override['LDAP_USER'] if override else DEFAULT_USER
     password = override['PASSWORD'] if override else DEFAULT_PASS
+    # ldap3 is only needed once we actually talk to a DC
+    from ldap3 import Server, Connection, ALL, NTLM
+    from ldap3.core.exceptions import LDAPSocketOpenError
 
     try:
         print(f"🔌 Connecting to LDAP server: {dc_ip}")
         server = Server(dc_ip, get_info=ALL, use_ssl=False, port=389)
-        conn = Connection(server, user=ldap_user, password=password, authentication=NTLM)
+        conn = Connection(server, user=ldap_user, password=password, authentication=NTLM,
+                          collect_usage=True)
 
-        if not conn.bind():
+        with span('ldap_bind'):
+            bound = conn.bind()
+        if not bound:
             print("❌ BIND FAILED")
             print("LDAP bind result:", conn.result)  # 🔍 Shows error like invalidCredentials
             raise Exception(f"❌ LDAP bind failed: {conn.result['description']}")
@@ -25,13 +30,15 @@ def connect_to_ad(override=None):
         print("❌ LDAP socket error:", str(e))
         raise Exception(f"❌ Cannot connect to {dc_ip}. Socket error: {str(e)}")
 
-def load_users_from_ad(config_override=None):
-    conn = connect_to_ad(config_override)
+def load_users_from_ad(config_override=None, conn=None):
+    # An already-bound connection (e.g. an ldap3 MOCK_SYNC one) skips connect_to_ad
+    conn = conn or connect_to_ad(config_override)
     base_dn = config_override['BASE_DN'] if config_override else DEFAULT_DN
-    conn.search(base_dn, '(&(objectClass=user)(sAMAccountName=*))', attributes=[
-        'sAMAccountName', 'givenName', 'sn', 'distinguishedName',
-        'lastLogonTimestamp', 'pwdLastSet'
-    ])
+    with span('ldap_search'):
+        conn.search(base_dn, '(&(objectClass=user)(sAMAccountName=*))', attributes=[
+            'sAMAccountName', 'givenName', 'sn', 'distinguishedName',
+            'lastLogonTimestamp', 'pwdLastSet', 'memberOf'
+        ])
 
     users = {}
     user_info = {}
@@ -48,6 +55,7 @@ def load_users_from_ad(config_override=None):
 
         last_login = convert_filetime(entry['lastLogonTimestamp'].value)
         pwd_set = convert_filetime(entry['pwdLastSet'].value)
+        groups = [extract_cn(g) for g in (entry['memberOf'].values or [])]
 
         users[username] = dn
         user_info[username] = {
@@ -55,18 +63,21 @@ def load_users_from_ad(config_override=None):
             'sn': surname,
             'lastLogon': last_login,
             'pwdLastSet': pwd_set,
-            'ou': ou
+            'ou': ou,
+            'groups': groups
         }
 
+    record_ldap_usage(conn)
     conn.unbind()
     return users, user_info
 
 def fetch_password_policy(config_override=None):
     conn = connect_to_ad(config_override)
     base_dn = config_override['BASE_DN'] if config_override else DEFAULT_DN
-    conn.search(base_dn, '(objectClass=domain)', attributes=[
-        'minPwdLength', 'pwdHistoryLength', 'maxPwdAge', 'minPwdAge', 'lockoutThreshold'
-    ])
+    with span('ldap_search'):
+        conn.search(base_dn, '(objectClass=domain)', attributes=[
+            'minPwdLength', 'pwdHistoryLength', 'maxPwdAge', 'minPwdAge', 'lockoutThreshold'
+        ])
 
     if not conn.entries:
         return "Unable to retrieve password policy.", []
@@ -103,6 +114,7 @@ def fetch_password_policy(config_override=None):
     else:
         compliance.append("✅ Lockout threshold is good.")
 
+    record_ldap_usage(conn)
     conn.unbind()
     return policy_text, compliance
 
@@ -129,6 +141,7 @@ def set_best_practice_policy(config_override=None):
         }
 
         success = conn.modify(dn, changes)
+        record_ldap_usage(conn)
         conn.unbind()
 
         if success:
@@ -145,6 +158,7 @@ def enforce_password_reset_all(config_override=None):
         conn = connect_to_ad(config_override)
         for username, dn in users.items():
             conn.modify(dn, {'pwdLastSet': [(2, [0])]})
+        record_ldap_usage(conn)
         conn.unbind()
         return True, f"✅ Password reset enforced for ALL users."
     except Exception as e:
@@ -158,6 +172,7 @@ def enforce_password_reset_selected(usernames, config_override=None):
             dn = users.get(username)
             if dn:
                 conn.modify(dn, {'pwdLastSet': [(2, [0])]})
+        record_ldap_usage(conn)
         conn.unbind()
         return True, f"✅ Password reset enforced for {len(usernames)} user(s)."
     except Exception as e:
@@ -166,6 +181,9 @@ def enforce_password_reset_selected(usernames, config_override=None):
 def convert_filetime(filetime):
     if not filetime:
         return None
+    if isinstance(filetime, datetime):
+        # ldap3 already formats AD timestamps when schema info is loaded
+        return filetime.replace(tzinfo=None) if filetime.year > 1601 else None
     try:
         return datetime(1601, 1, 1) + timedelta(microseconds=int(filetime) / 10)
     except:
@@ -177,3 +195,9 @@ def extract_ou(dn):
         if part.strip().startswith('OU='):
             return part.strip().split('=')[1]
     return 'Unknown'
+
+def extract_cn(dn):
+    first = dn.split(',')[0].strip()
+    if first.upper().startswith('CN='):
+        return first.split('=', 1)[1]
+    return first
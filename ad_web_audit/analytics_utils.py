@@ -0,0 +1,219 @@
+import io
+import numpy as np
+from datetime import datetime
+
+STALE_LOGIN_DAYS = 90
+STALE_PWD_DAYS = 180
+
+def _factorize(values):
+    """
+    Map hashable values to dense integer codes in first-seen order.
+    Returns (codes ndarray, list of unique values).
+    """
+    lookup = {v: i for i, v in enumerate(dict.fromkeys(values))}
+    codes = np.fromiter(map(lookup.__getitem__, values), dtype=np.int64, count=len(values))
+    return codes, list(lookup)
+
+def _distinct(sorted_values):
+    if len(sorted_values) == 0:
+        return sorted_values
+    return sorted_values[np.r_[True, sorted_values[1:] != sorted_values[:-1]]]
+
+def _day_numbers(dates):
+    # Proleptic ordinals are far cheaper to vectorize than datetime64 conversion
+    return np.array([d.toordinal() if d else -1 for d in dates], dtype=np.int64)
+
+def build_user_frame(eval_results, user_info, user_hashes=None, now=None):
+    """
+    Join evaluation results with directory info into flat NumPy columns.
+    eval_results: list of (username, password, status, score, reason)
+    user_info:    {username: {'ou', 'groups', 'lastLogon', 'pwdLastSet', ...}}
+    user_hashes:  optional {username: nt_hash}, used to detect reuse across uncracked accounts
+    """
+    today = (now or datetime.now()).toordinal()
+    user_hashes = user_hashes or {}
+    empty = {}
+
+    usernames = [r[0] for r in eval_results]
+    statuses = np.array([r[2] for r in eval_results], dtype=object)
+    infos = [user_info.get(u, empty) for u in usernames]
+
+    cracked = statuses != "Uncracked"
+    weak = statuses == "Weak"
+    score = np.array([r[3] for r in eval_results], dtype=np.float64)
+
+    in_directory = np.array([i is not empty for i in infos], dtype=bool)
+    last_logon = _day_numbers([i.get('lastLogon') for i in infos])
+    pwd_set = _day_numbers([i.get('pwdLastSet') for i in infos])
+    # Missing timestamps count as stale, matching /api/users (day granularity)
+    stale = in_directory & (
+        (last_logon < 0) | (today - last_logon > STALE_LOGIN_DAYS) |
+        (pwd_set < 0) | (today - pwd_set > STALE_PWD_DAYS)
+    )
+
+    ou_codes, ou_names = _factorize([i.get('ou', 'Unknown') for i in infos])
+
+    # Reuse key: NT hash when known, else the cracked password, else unique per user
+    reuse_keys = [
+        user_hashes.get(r[0]) or ('\0pw\0' + r[1] if r[2] != "Uncracked" else '\0user\0' + r[0])
+        for r in eval_results
+    ]
+    reuse_codes, _ = _factorize(reuse_keys)
+    cluster_size = np.bincount(reuse_codes)[reuse_codes] if len(reuse_codes) else reuse_codes
+    reused = cluster_size > 1
+
+    member_groups = [i.get('groups') or () for i in infos]
+    group_counts = np.array([len(g) for g in member_groups], dtype=np.int64)
+    group_user_idx = np.repeat(np.arange(len(infos)), group_counts)
+    group_codes, group_names = _factorize([g for groups in member_groups for g in groups])
+
+    return {
+        'usernames': usernames,
+        'statuses': statuses,
+        'cracked': cracked,
+        'weak': weak,
+        'score': score,
+        'stale': stale,
+        'ou_codes': ou_codes,
+        'ou_names': ou_names,
+        'reuse_codes': reuse_codes,
+        'reused': reused,
+        'group_user_idx': group_user_idx,
+        'group_codes': group_codes,
+        'group_names': group_names,
+    }
+
+# Columns kept as Python lists; everything else in the frame is an ndarray
+_LIST_COLUMNS = ('usernames', 'ou_names', 'group_names')
+
+def frame_to_bytes(frame):
+    """
+    Serialize a frame as an uncompressed .npz (no pickling), so another worker
+    can reuse it without reloading results and directory data.
+    """
+    columns = {k: (np.array(v, dtype=str) if k in _LIST_COLUMNS or k == 'statuses' else v)
+               for k, v in frame.items()}
+    buf = io.BytesIO()
+    np.savez(buf, **columns)
+    return buf.getvalue()
+
+def frame_from_bytes(data):
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        frame = {k: npz[k] for k in npz.files}
+    for k in _LIST_COLUMNS:
+        frame[k] = frame[k].tolist()
+    frame['statuses'] = frame['statuses'].astype(object)
+    return frame
+
+def _grouped_metrics(names, codes, rows, frame):
+    """
+    Aggregate per-user columns over (rows -> codes) with bincount.
+    rows selects users from the frame, codes gives each row's bucket.
+    """
+    n = len(names)
+    if n == 0:
+        return []
+
+    cracked = frame['cracked'][rows]
+    reused = frame['reused'][rows]
+
+    users = np.bincount(codes, minlength=n)
+    cracked_n = np.bincount(codes, weights=cracked, minlength=n)
+    weak_n = np.bincount(codes, weights=frame['weak'][rows], minlength=n)
+    stale_n = np.bincount(codes, weights=frame['stale'][rows], minlength=n)
+    reused_n = np.bincount(codes, weights=reused, minlength=n)
+    score_sum = np.bincount(codes, weights=np.where(cracked, frame['score'][rows], 0.0), minlength=n)
+
+    # Distinct reuse clusters touching each bucket
+    n_keys = int(frame['reuse_codes'].max()) + 1 if len(frame['reuse_codes']) else 1
+    pairs = _distinct(np.sort(codes[reused] * n_keys + frame['reuse_codes'][rows][reused]))
+    clusters_n = np.bincount(pairs // n_keys, minlength=n)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        crack_rate = cracked_n / users
+        weak_rate = weak_n / users
+        stale_ratio = stale_n / users
+        mean_score = score_sum / cracked_n
+
+    out = []
+    for i, name in enumerate(names):
+        out.append({
+            'name': name,
+            'users': int(users[i]),
+            'cracked': int(cracked_n[i]),
+            'crack_rate': round(float(crack_rate[i]) * 100, 1),
+            'weak': int(weak_n[i]),
+            'weak_rate': round(float(weak_rate[i]) * 100, 1),
+            'mean_score': None if np.isnan(mean_score[i]) else round(float(mean_score[i]), 1),
+            'stale': int(stale_n[i]),
+            'stale_ratio': round(float(stale_ratio[i]) * 100, 1),
+            'reused': int(reused_n[i]),
+            'reuse_clusters': int(clusters_n[i]),
+        })
+    out.sort(key=lambda m: (-m['crack_rate'], -m['users'], m['name'].lower()))
+    return out
+
+def _reuse_clusters(frame, limit):
+    idx = np.flatnonzero(frame['reused'])
+    if len(idx) == 0:
+        return []
+    codes = frame['reuse_codes'][idx]
+    order = np.argsort(codes, kind='stable')
+    idx, codes = idx[order], codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    sizes = np.diff(np.r_[starts, len(codes)])
+
+    clusters = []
+    for c in np.argsort(-sizes, kind='stable')[:limit]:
+        members = idx[starts[c]:starts[c] + sizes[c]]
+        clusters.append({
+            'size': int(sizes[c]),
+            'cracked': bool(frame['cracked'][members[0]]),
+            'members': [frame['usernames'][m] for m in members[:20]],
+            'ous': sorted({frame['ou_names'][frame['ou_codes'][m]] for m in members}),
+        })
+    return clusters
+
+def compute_risk_analytics(frame, top_clusters=10):
+    """
+    Per-OU and per-group crack rate, weak rate, mean score, stale ratio
+    and password reuse, computed over the whole population in one pass.
+    """
+    all_rows = np.arange(len(frame['usernames']))
+    total = len(all_rows)
+    return {
+        'total': total,
+        'cracked': int(frame['cracked'].sum()),
+        'weak': int(frame['weak'].sum()),
+        'stale': int(frame['stale'].sum()),
+        'reused': int(frame['reused'].sum()),
+        'by_ou': _grouped_metrics(frame['ou_names'], frame['ou_codes'], all_rows, frame),
+        'by_group': _grouped_metrics(frame['group_names'], frame['group_codes'],
+                                     frame['group_user_idx'], frame),
+        'reuse_clusters': _reuse_clusters(frame, top_clusters),
+    }
+
+def drill_down(frame, by, name):
+    """
+    Return per-user rows for one OU ('ou') or group ('group') bucket.
+    """
+    if by == 'ou':
+        if name not in frame['ou_names']:
+            return []
+        rows = np.flatnonzero(frame['ou_codes'] == frame['ou_names'].index(name))
+    elif by == 'group':
+        if name not in frame['group_names']:
+            return []
+        code = frame['group_names'].index(name)
+        rows = frame['group_user_idx'][frame['group_codes'] == code]
+    else:
+        raise ValueError(f"Unknown analytics dimension: {by}")
+
+    return [{
+        'username': frame['usernames'][i],
+        'status': frame['statuses'][i],
+        'score': float(frame['score'][i]),
+        'stale': bool(frame['stale'][i]),
+        'reused': bool(frame['reused'][i]),
+        'ou': frame['ou_names'][frame['ou_codes'][i]],
+    } for i in rows]
@@ -1,5 +1,5 @@
-from flask import Flask, render_template, request, jsonify, session, send_file
-from eval_utils import evaluate_password_file_from_john
+from flask import Flask, render_template, request, jsonify, session, send_file, Response
+from eval_utils import evaluate_password_file_from_john, load_user_hashes
 from ad_utils import (
     connect_to_ad,
     load_users_from_ad,
@@ -8,13 +8,111 @@ from ad_utils import (
     enforce_password_reset_all,
     enforce_password_reset_selected
 )
-from report_utils import generate_pdf_report
+import metrics_utils
+from metrics_utils import span
+import store_utils
+from config import WORDLIST_PATH, AUDIT_DIR, REPORT_DIR, DIRECTORY_CACHE_TTL, BUDGET_TOP_WORDS
 from datetime import datetime
+import hashlib
+import hmac
 import os
-import json
+import time
 
 app = Flask(__name__)
-app.secret_key = 'your-strong-secret-key'
+# Every worker must share the key, or sessions break across processes
+app.secret_key = os.environ.get('PASSAUDIT_SECRET_KEY', 'your-strong-secret-key')
+
+# ReportLab, NumPy (analytics, cracking engine) and ldap3 are imported on first
+# use inside the routes that need them, so a new worker starts fast.
+
+def current_audit_id():
+    """
+    Each browser session works on its own audit; results, config and jobs are keyed by it.
+    """
+    audit_id = session.get('audit_id')
+    if not audit_id:
+        audit_id = store_utils.new_audit_id()
+        session['audit_id'] = audit_id
+    return audit_id
+
+def current_config():
+    """
+    This audit's connection config; the bind password comes from the signed session cookie.
+    """
+    config = store_utils.load_config(current_audit_id())
+    if config is not None:
+        config['PASSWORD'] = session.get('ldap_password', '')
+    return config
+
+NO_HASHES = "No hashes uploaded for this audit. Upload an NTLM hash file first."
+
+def audit_hashes_path(audit_id):
+    """
+    The audit's own uploaded hash file, or None if nothing was uploaded yet.
+    """
+    path = os.path.join(AUDIT_DIR, audit_id, 'ntlm_hashes.txt')
+    return path if os.path.exists(path) else None
+
+def directory_cache_key(config_override):
+    """
+    Cache key bound to the full credentials, so a session that only knows the
+    DC, user and base DN (but not the password) never gets a cached directory.
+    Keyed HMAC, so the stored key reveals nothing about the password.
+    """
+    from config import DC_IP, LDAP_USER, PASSWORD, BASE_DN
+    cfg = config_override or {'DC_IP': DC_IP, 'LDAP_USER': LDAP_USER, 'PASSWORD': PASSWORD, 'BASE_DN': BASE_DN}
+    identity = f"{cfg['DC_IP']}|{cfg['LDAP_USER']}|{cfg['BASE_DN']}".lower()
+    raw = f"{identity}|{cfg.get('PASSWORD') or ''}"
+    return hmac.new(app.secret_key.encode(), raw.encode(), hashlib.sha256).hexdigest()
+
+def get_directory(config_override, refresh=False, rebuild_analytics=True):
+    """
+    load_users_from_ad through the shared directory cache. A fresh fetch
+    replaces the snapshot the analytics frame was built from, so the frame is
+    rebuilt right away from the user_info already in memory.
+    """
+    key = directory_cache_key(config_override)
+    cached = None if refresh else store_utils.cached_directory(key, DIRECTORY_CACHE_TTL)
+    if cached:
+        return cached
+    users, user_info = load_users_from_ad(config_override)
+    store_utils.cache_directory(key, users, user_info)
+    if rebuild_analytics:
+        try:
+            build_analytics_frame(current_audit_id(), config_override, user_info=user_info)
+        except Exception as e:
+            print("⚠️ Analytics frame not rebuilt:", str(e))
+    return users, user_info
+
+def run_evaluation(kind, **options):
+    """
+    Evaluate the current audit's hashes as a tracked job and store the results.
+    Returns (results, timing, job_id).
+    """
+    audit_id = current_audit_id()
+    job_id = store_utils.start_job(audit_id, kind)
+    try:
+        with metrics_utils.job() as timing:
+            if kind == 'budget':
+                from budget_utils import run_budgeted_audit
+                results, timing['schedule'] = run_budgeted_audit(audit_hashes_path(audit_id), **options)
+            else:
+                results = evaluate_password_file_from_john(audit_hashes_path(audit_id), **options)
+            with span('json_dump'):
+                version = store_utils.save_results(audit_id, results)
+            try:
+                with span('analytics_frame'):
+                    build_analytics_frame(audit_id, current_config(), version, results,
+                                          user_info=options.get('user_info') or None)
+            except Exception as e:
+                print("⚠️ Analytics frame not prebuilt:", str(e))
+    except Exception as e:
+        store_utils.finish_job(job_id, 'failed', error=str(e))
+        raise
+    finally:
+        publish_metrics(force=True)
+    store_utils.finish_job(job_id, 'done', timing=timing)
+    return results, timing, job_id
 
 @app.route('/')
 def welcome():
@@ -50,11 +148,13 @@ def set_config():
         'BASE_DN': data['base_dn']
     }
 
-    session['override_config'] = override  # ✅ Always save config
+    session['ldap_password'] = override['PASSWORD']
+    store_utils.save_config(current_audit_id(), override)  # ✅ Always save config
 
     # Optional: Validate connection (but don't block saving)
     try:
         conn = connect_to_ad(override)
+        metrics_utils.record_ldap_usage(conn)
         conn.unbind()
         return jsonify({'success': True})
     except Exception as e:
@@ -63,7 +163,7 @@ def set_config():
 @app.route('/api/current-config')
 def get_current_config():
     from config import DC_IP, LDAP_USER, PASSWORD, BASE_DN
-    override = session.get('override_config')
+    override = current_config()
     if override:
         return jsonify(override)
     return jsonify({
@@ -76,7 +176,7 @@ def get_current_config():
 @app.route('/api/users')
 def get_users():
     try:
-        _, user_info = load_users_from_ad(session.get('override_config'))
+        _, user_info = get_directory(current_config(), refresh=request.args.get('refresh') == '1')
     except Exception as e:
         return jsonify({'error': str(e), 'users': []}), 500
 
@@ -108,14 +208,14 @@ def get_users():
 @app.route('/api/policy')
 def api_policy():
     try:
-        policy_text, compliance_lines = fetch_password_policy(session.get('override_config'))
+        policy_text, compliance_lines = fetch_password_policy(current_config())
         return {'policy': policy_text, 'compliance': compliance_lines}
     except Exception as e:
         return jsonify({'error': str(e), 'policy': '', 'compliance': []}), 500
 
 @app.route('/api/apply-best-policy', methods=['POST'])
 def apply_best_policy():
-    success, msg = set_best_practice_policy(session.get('override_config'))
+    success, msg = set_best_practice_policy(current_config())
     return jsonify({'success': success, 'message': msg})
 
 @app.route('/upload-hashes', methods=['POST'])
@@ -125,42 +225,109 @@ def upload_hashes():
         return {'success': False, 'error': 'No file uploaded'}, 400
 
     print(f"📥 Received file: {uploaded_file.filename}")
-    save_path = 'ntlm_hashes.txt'
-    uploaded_file.save(save_path)
+    save_dir = os.path.join(AUDIT_DIR, current_audit_id())
+    os.makedirs(save_dir, exist_ok=True)
+    uploaded_file.save(os.path.join(save_dir, 'ntlm_hashes.txt'))
 
     try:
-        results = evaluate_password_file_from_john()
-        result_file = 'static/data/eval_results.json'
-        os.makedirs("static/data", exist_ok=True)
-        with open(result_file, 'w') as f:
-            json.dump(results, f)
-        return {'success': True, 'results': results}
+        results, timing, job_id = run_evaluation('upload')
+        return {'success': True, 'results': results, 'timing': timing, 'job_id': job_id}
     except Exception as e:
         print("❌ Cracking error:", str(e))
         return {'success': False, 'error': str(e)}, 500
 
 @app.route('/api/re-evaluate', methods=['POST'])
 def re_evaluate():
+    # Optional extras: {"rules": true, "mask": "?u?l?l?l?d?d?d?d", "hybrid_mask": "?d?d?d?d"}
+    # Interrupted runs with the same inputs resume from their checkpoint in SESSION_DIR
+    options = request.get_json(silent=True) or {}
+    if not audit_hashes_path(current_audit_id()):
+        return jsonify({'success': False, 'error': NO_HASHES}), 404
     try:
-        results = evaluate_password_file_from_john()
-        result_file = 'static/data/eval_results.json'
-        os.makedirs("static/data", exist_ok=True)
-        with open(result_file, 'w') as f:
-            json.dump(results, f)
-        return jsonify({'success': True, 'results': results})
+        results, timing, job_id = run_evaluation(
+            're-evaluate',
+            mask=options.get('mask') or None,
+            hybrid_mask=options.get('hybrid_mask') or None,
+            rules=bool(options.get('rules'))
+        )
+        return jsonify({'success': True, 'results': results, 'timing': timing, 'job_id': job_id})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/budget-audit', methods=['POST'])
+def budget_audit():
+    # {"time_budget": 600, "max_candidates": 50000000, "top_words": 10000,
+    #  "rules": true, "mask": "?u?l?l?l?d?d?d?d", "hybrid_mask": "?d?d"}
+    # Privileged accounts go first; stops at whichever budget runs out first
+    options = request.get_json(silent=True) or {}
+    if not options.get('time_budget') and not options.get('max_candidates'):
+        return jsonify({'success': False, 'error': 'Set time_budget (seconds) and/or max_candidates'}), 400
+    if not audit_hashes_path(current_audit_id()):
+        return jsonify({'success': False, 'error': NO_HASHES}), 404
+    try:
+        users, user_info = get_directory(current_config())
+    except Exception as e:
+        print("⚠️ Budgeted audit without directory data, no account prioritization:", str(e))
+        users, user_info = {}, {}
+    try:
+        results, timing, job_id = run_evaluation(
+            'budget',
+            users=users,
+            user_info=user_info,
+            time_budget=float(options['time_budget']) if options.get('time_budget') else None,
+            max_candidates=int(options['max_candidates']) if options.get('max_candidates') else None,
+            top_words=int(options.get('top_words') or BUDGET_TOP_WORDS),
+            rules=bool(options.get('rules')),
+            mask=options.get('mask') or None,
+            hybrid_mask=options.get('hybrid_mask') or None
+        )
+        return jsonify({'success': True, 'results': results, 'schedule': timing['schedule'],
+                        'timing': timing, 'job_id': job_id})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/estimate-attack', methods=['POST'])
+def estimate_attack_route():
+    data = request.get_json(silent=True) or {}
+    mask = data.get('mask')
+    if not mask:
+        return jsonify({'success': False, 'error': 'Missing mask'}), 400
+    from crack_utils import build_segments, estimate_attack, load_wordlist
+    try:
+        if data.get('hybrid'):
+            segments = build_segments(mask, load_wordlist(WORDLIST_PATH), mode='append')
+        else:
+            segments = build_segments(mask)
+        return jsonify({'success': True, **estimate_attack(segments)})
+    except (ValueError, OSError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/results')
+def api_results():
+    results, _ = store_utils.load_results(current_audit_id())
+    if results is None:
+        return jsonify({'error': 'No evaluation results found.'}), 404
+    return jsonify(results)
+
+@app.route('/api/jobs')
+def api_jobs():
+    return jsonify(store_utils.list_jobs(current_audit_id()))
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    job = store_utils.get_job(job_id, current_audit_id())
+    if not job:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
 @app.route('/generate-report')
 def generate_report():
-    result_file = 'static/data/eval_results.json'
-    if not os.path.exists(result_file):
+    audit_id = current_audit_id()
+    eval_results, _ = store_utils.load_results(audit_id)
+    if eval_results is None:
         return "❌ No evaluation results found. Please evaluate hashes first.", 404
 
-    with open(result_file, 'r') as f:
-        eval_results = json.load(f)
-
-    _, user_info = load_users_from_ad(session.get('override_config'))
+    _, user_info = get_directory(current_config())
     now = datetime.now()
     stale_accounts = []
     for username, info in user_info.items():
@@ -169,10 +336,12 @@ def generate_report():
         if login_age > 90 or pwd_age > 180:
             stale_accounts.append(f"{username} - Last Login: {login_age}d, Pwd Age: {pwd_age}d")
 
-    policy_text, compliance = fetch_password_policy(session.get('override_config'))
-    output_path = "static/reports/report.pdf"
-    os.makedirs("static/reports", exist_ok=True)
-    generate_pdf_report(eval_results, policy_text, compliance, output_path)
+    policy_text, compliance = fetch_password_policy(current_config())
+    output_path = os.path.join(REPORT_DIR, f"report_{audit_id}.pdf")
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    from report_utils import generate_pdf_report
+    with span('pdf_render'):
+        generate_pdf_report(eval_results, policy_text, compliance, output_path)
 
     return send_file(output_path, as_attachment=True)
 
@@ -181,11 +350,8 @@ from ad_utils import fetch_password_policy
 
 @app.route('/generate-html-report')
 def html_report():
-    try:
-        with open("static/data/eval_results.json", "r") as f:
-            eval_results = json.load(f)
-    except:
-        eval_results = []
+    eval_results, _ = store_utils.load_results(current_audit_id())
+    eval_results = eval_results or []
 
     total = len(eval_results)
     cracked = [r for r in eval_results if r[2] != "Uncracked"]
@@ -204,7 +370,7 @@ def html_report():
         risks.append("Password hygiene appears acceptable.")
 
     # ✅ Use session override config if present
-    config_override = session.get('override_config')
+    config_override = current_config()
 
     try:
         policy_text, compliance_lines = fetch_password_policy(config_override=config_override)
@@ -241,19 +407,132 @@ def html_report():
         results=eval_results
     )
 
+ANALYTICS_CACHE_SIZE = 8
+_analytics_cache = {}
+
+def analytics_inputs(audit_id, config_override):
+    """
+    (results version, directory snapshot) an analytics frame is built from.
+    The snapshot changes when the directory is re-fetched or invalidated,
+    not when DIRECTORY_CACHE_TTL lapses.
+    """
+    key = directory_cache_key(config_override)
+    return store_utils.results_version(audit_id), f"{key}@{store_utils.directory_fetched(key)}"
+
+def _remember_frame(audit_id, inputs, frame):
+    if len(_analytics_cache) >= ANALYTICS_CACHE_SIZE and audit_id not in _analytics_cache:
+        _analytics_cache.pop(next(iter(_analytics_cache)))
+    _analytics_cache[audit_id] = (inputs, frame)
+
+def build_analytics_frame(audit_id, config_override, version=None, eval_results=None, user_info=None):
+    """
+    Join results with directory data and store the frame, so every worker's
+    first dashboard load just reads the columns back. Called when results are
+    saved and when the directory is re-fetched, with whatever is already in memory.
+    """
+    if eval_results is None:
+        eval_results, version = store_utils.load_results(audit_id)
+        if eval_results is None:
+            return None
+    if user_info is None:
+        try:
+            _, user_info = get_directory(config_override, rebuild_analytics=False)
+        except Exception as e:
+            print("⚠️ Analytics without directory data:", str(e))
+            user_info = {}
+    hashes_path = audit_hashes_path(audit_id)
+    user_hashes = load_user_hashes(hashes_path) if hashes_path else {}
+
+    from analytics_utils import build_user_frame, frame_to_bytes
+    frame = build_user_frame(eval_results, user_info, user_hashes)
+    key = directory_cache_key(config_override)
+    inputs = (version, f"{key}@{store_utils.directory_fetched(key)}")
+    store_utils.save_frame(audit_id, *inputs, frame_to_bytes(frame))
+    _remember_frame(audit_id, inputs, frame)
+    return frame
+
+def get_analytics_frame():
+    """
+    The current audit's joined results/directory frame: from this worker's
+    cache, else the stored frame, else built (and stored) now.
+    """
+    audit_id = current_audit_id()
+    config_override = current_config()
+    inputs = analytics_inputs(audit_id, config_override)
+    if inputs[0] is None:
+        return None
+
+    cached = _analytics_cache.get(audit_id)
+    if cached and cached[0] == inputs:
+        return cached[1]
+
+    data = store_utils.load_frame(audit_id, *inputs)
+    if data is None:
+        return build_analytics_frame(audit_id, config_override)
+    from analytics_utils import frame_from_bytes
+    frame = frame_from_bytes(data)
+    _remember_frame(audit_id, inputs, frame)
+    return frame
+
+@app.route('/api/analytics')
+def api_analytics():
+    frame = get_analytics_frame()
+    if frame is None:
+        return jsonify({'error': 'No evaluation results found.'}), 404
+    from analytics_utils import compute_risk_analytics
+    return jsonify(compute_risk_analytics(frame))
+
+@app.route('/api/analytics/<by>/<path:name>')
+def api_analytics_drill_down(by, name):
+    if by not in ('ou', 'group'):
+        return jsonify({'error': f'Unknown dimension: {by}'}), 400
+    frame = get_analytics_frame()
+    if frame is None:
+        return jsonify({'error': 'No evaluation results found.'}), 404
+    from analytics_utils import drill_down
+    return jsonify({'by': by, 'name': name, 'users': drill_down(frame, by, name)})
+
+METRICS_PUBLISH_INTERVAL = 5  # seconds between a worker's snapshot writes
+_metrics_published = 0.0
+
+def publish_metrics(force=False):
+    """
+    Write this worker's metrics snapshot to the shared store, at most every
+    METRICS_PUBLISH_INTERVAL seconds unless forced.
+    """
+    global _metrics_published
+    if not metrics_utils.ENABLED:
+        return
+    now = time.time()
+    if force or now - _metrics_published >= METRICS_PUBLISH_INTERVAL:
+        _metrics_published = now
+        store_utils.publish_metrics(metrics_utils.worker_id(), metrics_utils.snapshot())
+
+@app.after_request
+def publish_metrics_after_request(response):
+    publish_metrics()
+    return response
+
+@app.route('/metrics')
+def metrics():
+    # Each gunicorn worker keeps its own registries; merge every worker's
+    # published snapshot so the scrape is not limited to whichever one answered
+    publish_metrics(force=True)
+    merged = metrics_utils.merge_snapshots(store_utils.load_metrics())
+    return Response(metrics_utils.render_prometheus(merged), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/enforce-reset', methods=['POST'])
 def enforce_reset():
     data = request.get_json()
     users = data.get('users', [])
+    config_override = current_config()
     if users:
-        success, msg = enforce_password_reset_selected(users, session.get('override_config'))
+        success, msg = enforce_password_reset_selected(users, config_override)
     else:
-        success, msg = enforce_password_reset_all(session.get('override_config'))
+        success, msg = enforce_password_reset_all(config_override)
+    store_utils.invalidate_directory(directory_cache_key(config_override))
     return jsonify({'success': success, 'message': msg})
 
 if __name__ == '__main__':
-    result_file = 'static/data/eval_results.json'
-    if os.path.exists(result_file):
-        os.remove(result_file)
-        print("✅ Old evaluation results cleared.")
+    # Development server only; use wsgi.py for multi-worker serving
     app.run(debug=True)
@@ -0,0 +1,314 @@
+"""
+benchmark.py
+
+Benchmark harness for the audit pipeline. Generates a deterministic
+synthetic dataset per scale (see synthetic_data.py) and measures each stage
+in a fresh process so peak RSS is attributable to that stage alone.
+
+Stages:
+- evaluate_password   per-call scoring latency over the synthetic passwords
+- evaluate_file       evaluate_password_file_from_john over hashes + wordlist
+- load_users          load_users_from_ad against an ldap3 MOCK_SYNC server
+- pdf_report          generate_pdf_report over the evaluation results
+- startup             cold start of a new worker: fresh interpreter, `import app`
+                      and the first request (independent of scale, run once)
+
+Usage:
+    python benchmark.py --scales 1k,10k,100k,1M --out bench_results/
+    python benchmark.py --scales 10k --compare bench_results/previous.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+STAGES = ['evaluate_password', 'evaluate_file', 'load_users', 'pdf_report', 'startup']
+STARTUP_BUDGET_SECONDS = 1.0
+
+# Runs in a fresh interpreter so nothing is already imported
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+status = app.app.test_client().get('/dashboard').status_code
+done = time.perf_counter()
+from metrics_utils import rss_high_water_bytes
+json.dump({'import': imported - start, 'first_request': done - imported, 'status': status,
+           'peak_rss_mb': rss_high_water_bytes() / (1024 * 1024)}, sys.stdout)
+"""
+SCALE_SUFFIXES = {'k': 10**3, 'm': 10**6}
+
+def parse_scale(text):
+    text = text.strip().lower()
+    if text[-1] in SCALE_SUFFIXES:
+        return int(float(text[:-1]) * SCALE_SUFFIXES[text[-1]])
+    return int(text)
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def peak_rss_mb():
+    from metrics_utils import rss_high_water_bytes  # handles platforms without `resource`
+    return rss_high_water_bytes() / (1024 * 1024)
+
+def _load_users(dataset):
+    # Only the stages that need the user dicts pay for them in peak RSS
+    with open(dataset['users_path'], 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _time_stage(stage, dataset, repeats):
+    """
+    Run one stage `repeats` times. Returns (items, run_seconds, latencies_seconds[, extra]).
+    """
+    runs, latencies = [], []
+
+    if stage == 'startup':
+        here = os.path.dirname(os.path.abspath(__file__))
+        imports, rss = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=here,
+                                 capture_output=True, text=True, check=True)
+            runs.append(time.perf_counter() - start)
+            probe = json.loads(out.stdout.strip().splitlines()[-1])
+            if probe['status'] != 200:
+                raise RuntimeError(f"first request returned {probe['status']}")
+            imports.append(probe['import'])
+            latencies.append(probe['first_request'])
+            rss.append(probe['peak_rss_mb'])
+        # The probe's own RSS, not this wrapper's; a cold start has no throughput to compare
+        return 1, runs, latencies, {'import_seconds': [round(t, 6) for t in imports],
+                                    'throughput_per_s': None, 'rss_before_mb': None,
+                                    'peak_rss_mb': round(max(rss), 1)}
+
+    from eval_utils import evaluate_password, evaluate_password_file_from_john
+
+    if stage == 'evaluate_password':
+        pairs = [(u['username'], u['password']) for u in _load_users(dataset)]
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for username, password in pairs:
+                t = time.perf_counter()
+                evaluate_password(username, password)
+                latencies.append(time.perf_counter() - t)
+            runs.append(time.perf_counter() - start)
+        return len(pairs), runs, latencies
+
+    if stage == 'evaluate_file':
+        for _ in range(repeats):
+            start = time.perf_counter()
+            evaluate_password_file_from_john(dataset['hashes_path'], dataset['wordlist_path'],
+                                             session_dir=None)
+            runs.append(time.perf_counter() - start)
+        return dataset['n_users'], runs, runs
+
+    if stage == 'load_users':
+        from ad_utils import load_users_from_ad
+        from synthetic_data import BASE_DN, mock_ldap_connection
+
+        conn = mock_ldap_connection(_load_users(dataset))
+        for _ in range(repeats):
+            conn.bind()
+            start = time.perf_counter()
+            loaded, _ = load_users_from_ad({'BASE_DN': BASE_DN}, conn=conn)
+            runs.append(time.perf_counter() - start)
+        return len(loaded), runs, runs
+
+    if stage == 'pdf_report':
+        from report_utils import generate_pdf_report
+
+        results = evaluate_password_file_from_john(dataset['hashes_path'], dataset['wordlist_path'],
+                                                   session_dir=None)
+        output_path = os.path.join(dataset['dir'], 'report.pdf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            generate_pdf_report(results, "Minimum Password Length: 7", [], output_path)
+            runs.append(time.perf_counter() - start)
+        return len(results), runs, runs
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+def _stage_worker(stage, dataset, repeats, queue):
+    try:
+        rss_before = peak_rss_mb()
+        items, runs, latencies, *extra = _time_stage(stage, dataset, repeats)
+        queue.put({'items': items, 'runs': runs, 'latencies': latencies, 'extra': extra[0] if extra else {},
+                   'rss_before_mb': rss_before, 'peak_rss_mb': peak_rss_mb()})
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+def run_stage(stage, scale, dataset, repeats, timeout):
+    """
+    Run a stage in a spawned process and summarize throughput, latency and RSS.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_stage_worker, args=(stage, dataset, repeats, queue))
+    proc.start()
+    try:
+        raw = queue.get(timeout=timeout)
+    except Exception:
+        raw = {'error': f"timeout after {timeout}s"}
+    proc.join(5)
+    if proc.is_alive():
+        proc.terminate()
+
+    summary = {'stage': stage, 'scale': scale}
+    if 'error' in raw:
+        summary['error'] = raw['error']
+        return summary
+
+    runs = raw['runs']
+    latencies = sorted(raw['latencies'])
+    best = min(runs)
+    summary.update({
+        'items': raw['items'],
+        'repeats': len(runs),
+        'run_seconds': [round(r, 6) for r in runs],
+        'throughput_per_s': round(raw['items'] / best, 2) if best else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 4),
+            'p90': round(percentile(latencies, 90) * 1000, 4),
+            'p99': round(percentile(latencies, 99) * 1000, 4),
+            'max': round(latencies[-1] * 1000, 4),
+        },
+        'rss_before_mb': round(raw['rss_before_mb'], 1),
+        'peak_rss_mb': round(raw['peak_rss_mb'], 1),
+        **raw['extra'],  # stage-specific fields, may override the ones above
+    })
+    return summary
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def compare_results(current, previous, threshold=0.10):
+    """
+    Print per-stage throughput and peak RSS deltas against a previous run.
+    Returns the number of stages whose throughput regressed beyond threshold.
+    """
+    old = {(r['stage'], r['scale']): r for r in previous['results'] if 'error' not in r}
+    regressions = 0
+    print(f"\n{'stage':<20}{'scale':>10}{'throughput Δ':>15}{'peak RSS Δ':>14}")
+    for r in current['results']:
+        prev = old.get((r['stage'], r['scale']))
+        if 'error' in r or not prev:
+            continue
+        rss = r['peak_rss_mb'] - prev['peak_rss_mb']
+        if not r.get('throughput_per_s') or not prev.get('throughput_per_s'):
+            # No throughput on one side (startup, or an instant run): RSS only
+            print(f"{r['stage']:<20}{r['scale']:>10}{'-':>15}{rss:>+12.1f}MB")
+            continue
+        tp = r['throughput_per_s'] / prev['throughput_per_s'] - 1
+        flag = ''
+        if tp < -threshold:
+            regressions += 1
+            flag = '  ⚠️ regression'
+        print(f"{r['stage']:<20}{r['scale']:>10}{tp:>+14.1%}{rss:>+12.1f}MB{flag}")
+    return regressions
+
+def print_result(result):
+    stage, scale = result['stage'], result['scale']
+    if 'error' in result:
+        print(f"❌ {stage:<20}{scale:>10}  {result['error']}")
+        return
+    lat = result['latency_ms']
+    throughput = '-' if result['throughput_per_s'] is None else f"{result['throughput_per_s']}/s"
+    print(f"⏱️ {stage:<20}{scale:>10}  {throughput:>14}  "
+          f"p50 {lat['p50']}ms  p99 {lat['p99']}ms  peak RSS {result['peak_rss_mb']}MB")
+    if stage == 'startup':
+        cold = min(result['run_seconds'])
+        verdict = '✅' if cold < STARTUP_BUDGET_SECONDS else '⚠️ over budget'
+        print(f"   cold start {cold:.3f}s (import {min(result['import_seconds']):.3f}s, "
+              f"first request p50 {lat['p50']}ms) {verdict}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PassAudit Pro benchmark harness")
+    parser.add_argument('--scales', default='1k,10k,100k,1M', help="comma-separated user counts (k/M suffixes)")
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated stages to run")
+    parser.add_argument('--crack-rate', type=float, default=0.3)
+    parser.add_argument('--reuse-rate', type=float, default=0.1)
+    parser.add_argument('--wordlist-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1337)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--timeout', type=int, default=1800, help="seconds per stage before giving up")
+    parser.add_argument('--out', default='bench_results', help="directory for JSON results")
+    parser.add_argument('--compare', help="previous results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    from synthetic_data import generate_dataset
+
+    scales = [parse_scale(s) for s in args.scales.split(',') if s.strip()]
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': [],
+    }
+
+    # startup doesn't depend on the dataset: run it once, not per scale
+    if 'startup' in stages:
+        result = run_stage('startup', '-', None, args.repeats, args.timeout)
+        report['results'].append(result)
+        print_result(result)
+    scaled_stages = [s for s in stages if s != 'startup']
+
+    with tempfile.TemporaryDirectory(prefix='passaudit-bench-') as tmp:
+        for scale in scales if scaled_stages else []:
+            print(f"📦 Generating synthetic dataset: {scale} users")
+            start = time.perf_counter()
+            dataset = generate_dataset(os.path.join(tmp, str(scale)), scale, args.crack_rate,
+                                       args.reuse_rate, args.wordlist_size, args.seed)
+            print(f"   done in {time.perf_counter() - start:.1f}s")
+
+            for stage in scaled_stages:
+                result = run_stage(stage, scale, dataset, args.repeats, args.timeout)
+                report['results'].append(result)
+                print_result(result)
+
+    os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    out_path = os.path.join(args.out, f"bench_{stamp}_{report['meta']['git_revision'] or 'local'}.json")
+    n = 1
+    while os.path.exists(out_path):
+        n += 1
+        out_path = os.path.join(args.out, f"bench_{stamp}_{report['meta']['git_revision'] or 'local'}_{n}.json")
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results saved to {out_path}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+        return 1 if compare_results(report, previous) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
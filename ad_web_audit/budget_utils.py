@@ -0,0 +1,348 @@
+"""
+Time- and candidate-bounded audits for fixed maintenance windows.
+
+Accounts are ranked from the directory data (privileged groups and admin
+naming first, then privileged OUs, then everyone else) and attack stages
+run cheapest / highest-yield first:
+
+    derived_privileged  company name, seasons, common defaults and the names of
+                        privileged accounts, expanded with digits/years/symbols
+    top_words    the first BUDGET_TOP_WORDS wordlist entries
+    top_rules    mangling rules over those top words
+    derived      the same expansion over every other uncracked account's names
+    wordlist     the rest of the wordlist
+    wordlist_rules  rules over the rest (only with rules=True)
+    mask         optional mask attack
+    hybrid       optional wordlist + mask attack
+
+The run stops cleanly at the deadline or candidate cap and returns whatever
+was cracked, with per-stage yield so the next window can be planned.
+Budgeted runs are not checkpointed; each window starts from the cheap stages.
+"""
+
+import re
+import time
+from datetime import datetime
+
+from config import (HASHES_PATH, WORDLIST_PATH, BASE_DN, PRIVILEGED_GROUPS, PRIVILEGED_OUS,
+                    BUDGET_TOP_WORDS)
+from crack_utils import (RULES, TargetSet, build_segments, crack_words, keyspace, load_wordlist,
+                         run_attack, scan_range)
+from eval_utils import load_user_hashes, score_results
+from metrics_utils import span, incr, gauge
+
+TIERS = ['privileged', 'privileged_ou', 'standard']
+SCHEDULE_BATCH = 1 << 16   # candidates between deadline checks
+MASK_CHECK_SECONDS = 0.5   # target time per mask chunk, bounds deadline overshoot
+
+ADMIN_NAME = re.compile(r'^adm|admin|^da[-_.]|[-_.](adm|da)$', re.IGNORECASE)
+SUFFIXES = ('1', '12', '123', '1234', '!', '1!', '123!', '01', '@1')
+YEARS_BACK = 3
+COMMON_BASES = ('welcome', 'password', 'passw0rd', 'changeme', 'letmein', 'spring', 'summer',
+                'autumn', 'fall', 'winter')
+
+class Budget:
+    def __init__(self, seconds=None, candidates=None):
+        self.seconds = seconds
+        self.candidates = candidates
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.used = 0
+
+    def expired(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.candidates is not None and self.used >= self.candidates
+
+    def take(self, n):
+        """
+        How many of the next n candidates still fit in the candidate budget.
+        """
+        if self.candidates is None:
+            return n
+        return max(0, min(n, self.candidates - self.used))
+
+    def stop_reason(self):
+        if self.candidates is not None and self.used >= self.candidates:
+            return 'candidates'
+        return 'deadline'
+
+# === Target prioritization ===
+
+def account_tier(username, dn=None, info=None):
+    """
+    0 = privileged group member or admin-style name, 1 = privileged OU, 2 = everyone else.
+    """
+    info = info or {}
+    groups = {g.lower() for g in info.get('groups', [])}
+    if groups & {g.lower() for g in PRIVILEGED_GROUPS} or ADMIN_NAME.search(username):
+        return 0
+    if dn:
+        ous = {p.strip()[3:].lower() for p in dn.split(',') if p.strip().upper().startswith('OU=')}
+    else:
+        ous = {info.get('ou', '').lower()}
+    if ous & {o.lower() for o in PRIVILEGED_OUS}:
+        return 1
+    return 2
+
+def rank_accounts(user_hashes, users=None, user_info=None):
+    """
+    Usernames with a hash, highest-value first. Returns (ordered usernames, {username: tier}).
+    """
+    users = users or {}
+    user_info = user_info or {}
+    tiers = {u: account_tier(u, users.get(u), user_info.get(u)) for u in user_hashes}
+    ordered = sorted(user_hashes, key=lambda u: tiers[u])  # stable: keeps file order within a tier
+    return ordered, tiers
+
+# === Derived candidates ===
+
+def _expand(base, years):
+    for form in dict.fromkeys((base.lower(), base.capitalize())):
+        yield form
+        for suffix in SUFFIXES:
+            yield form + suffix
+        for year in years:
+            yield form + year
+            yield form + year + '!'
+            yield form + year[2:]
+
+def _years(now=None):
+    this_year = (now or datetime.now()).year
+    return [str(y) for y in range(this_year + 1, this_year - YEARS_BACK - 1, -1)]
+
+def domain_label(users=None):
+    """
+    First DC component of the domain, e.g. 'contoso' for dc=contoso,dc=local.
+    """
+    dn = next(iter((users or {}).values()), None) or BASE_DN
+    for part in dn.split(','):
+        if part.strip().lower().startswith('dc='):
+            return part.strip()[3:]
+    return None
+
+def account_bases(username, info=None):
+    info = info or {}
+    given = (info.get('givenName') or '').strip()
+    surname = (info.get('sn') or '').strip()
+    bases = [username, given, surname, given + surname, given[:1] + surname, surname + given[:1]]
+    return [b for b in dict.fromkeys(bases) if len(b) >= 3]
+
+def derived_candidates(accounts, user_info=None, users=None, now=None, shared=True, seen=None):
+    """
+    Yield candidates built from domain-wide bases (company name, seasons,
+    common defaults, if shared) and then from each account's names, in the
+    given order. Bases already in `seen` are skipped; new ones are added.
+    """
+    user_info = user_info or {}
+    seen = set() if seen is None else seen
+    years = _years(now)
+    bases = []
+    if shared:
+        label = domain_label(users)
+        bases = ([label] if label else []) + list(COMMON_BASES)
+    for base in bases:
+        if base.lower() not in seen:
+            seen.add(base.lower())
+            yield from _expand(base, years)
+    for username in accounts:
+        for base in account_bases(username, user_info.get(username)):
+            if base.lower() not in seen:
+                seen.add(base.lower())
+                yield from _expand(base, years)
+
+# === Scheduler ===
+
+class AuditScheduler:
+    def __init__(self, user_hashes, users=None, user_info=None, wordlist_path=WORDLIST_PATH,
+                 time_budget=None, max_candidates=None, top_words=BUDGET_TOP_WORDS,
+                 rules=False, mask=None, hybrid_mask=None, processes=None):
+        self.user_hashes = user_hashes
+        self.users = users or {}
+        self.user_info = user_info or {}
+        self.wordlist_path = wordlist_path
+        self.top_words = top_words
+        self.rules = rules
+        self.mask = mask
+        self.hybrid_mask = hybrid_mask
+        self.processes = processes
+        self.budget = Budget(time_budget, max_candidates)
+
+        self.accounts, self.tiers = rank_accounts(user_hashes, self.users, self.user_info)
+        self.hash_users = {}
+        for user in self.accounts:
+            self.hash_users.setdefault(user_hashes[user], []).append(user)
+        self.remaining = set(self.hash_users)
+        self.cracked = {}
+        self.stages = []
+        self._seen_bases = set()
+
+    def _uncracked_accounts(self, privileged):
+        return [u for u in self.accounts
+                if self.user_hashes[u] in self.remaining and (self.tiers[u] < 2) == privileged]
+
+    def _tier_counts(self, hashes):
+        counts = dict.fromkeys(TIERS, 0)
+        for h in hashes:
+            for user in self.hash_users.get(h, ()):
+                counts[TIERS[self.tiers[user]]] += 1
+        return counts
+
+    def _done(self):
+        return self.budget.expired() or not self.remaining
+
+    def _record(self, stats, found):
+        new = {h: pw for h, pw in found.items() if h in self.remaining}
+        self.cracked.update(new)
+        self.remaining.difference_update(new)
+        stats['cracked'].update(new)
+
+    def _crack_stream(self, stats, candidates):
+        targets = TargetSet(self.remaining)
+        batch = []
+        for word in candidates:
+            if not word:
+                continue
+            batch.append(word)
+            if len(batch) >= SCHEDULE_BATCH:
+                if not self._crack_batch(stats, targets, batch):
+                    return False
+                batch = []
+        if batch:
+            return self._crack_batch(stats, targets, batch)
+        return True
+
+    def _crack_batch(self, stats, targets, batch):
+        batch = batch[:self.budget.take(len(batch))]
+        if batch:
+            start = time.perf_counter()
+            self._record(stats, crack_words(batch, targets))
+            elapsed = time.perf_counter() - start
+            self.budget.used += len(batch)
+            stats['candidates'] += len(batch)
+            incr('candidates_hashed', len(batch))
+            if elapsed > 0:
+                gauge('hashes_per_second', round(len(batch) / elapsed, 1))
+        return not self._done()
+
+    def _run_mask(self, stats, segments):
+        if self._done():
+            return False
+        total = keyspace(segments)
+        end_index = self.budget.take(total)
+
+        # The first batch doubles as the rate probe, so it counts and can crack
+        probe = min(SCHEDULE_BATCH, end_index)
+        start = time.perf_counter()
+        found = scan_range(segments, 0, probe, TargetSet(self.remaining))
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.budget.used += probe
+        stats['candidates'] += probe
+        incr('candidates_hashed', probe)
+        self._record(stats, found)
+
+        next_index = probe
+        if probe < end_index and not self._done():
+            chunk = max(SCHEDULE_BATCH, int(probe / elapsed * MASK_CHECK_SECONDS))
+            found, next_index = run_attack(segments, self.remaining, self.processes, start_index=probe,
+                                           end_index=end_index, chunk_size=chunk, should_stop=self._done)
+            self.budget.used += next_index - probe
+            stats['candidates'] += next_index - probe
+            self._record(stats, found)
+        return next_index >= total
+
+    def _plan(self):
+        words = None
+
+        def wordlist():
+            nonlocal words
+            if words is None:
+                words = load_wordlist(self.wordlist_path)
+            return words
+
+        plan = [
+            ('derived_privileged', lambda s: self._crack_stream(s, derived_candidates(
+                self._uncracked_accounts(True), self.user_info, self.users, seen=self._seen_bases))),
+            ('top_words', lambda s: self._crack_stream(s, wordlist()[:self.top_words])),
+            ('top_rules', lambda s: all(self._crack_stream(s, map(rule, wordlist()[:self.top_words]))
+                                        for _, rule in RULES[1:])),
+            ('derived', lambda s: self._crack_stream(s, derived_candidates(
+                self._uncracked_accounts(False), self.user_info, self.users, shared=False,
+                seen=self._seen_bases))),
+            ('wordlist', lambda s: self._crack_stream(s, wordlist()[self.top_words:])),
+        ]
+        if self.rules:
+            plan.append(('wordlist_rules', lambda s: all(
+                self._crack_stream(s, map(rule, wordlist()[self.top_words:])) for _, rule in RULES[1:])))
+        if self.mask:
+            plan.append(('mask', lambda s: self._run_mask(s, build_segments(self.mask))))
+        if self.hybrid_mask:
+            plan.append(('hybrid', lambda s: self._run_mask(
+                s, build_segments(self.hybrid_mask, wordlist(), mode='append'))))
+        return plan
+
+    def run(self):
+        """
+        Run stages in order until the budget runs out or every hash is cracked.
+        Returns ({hex_hash: password}, stats).
+        """
+        start = time.perf_counter()
+        stopped_by = None
+        with span('budget_audit'):
+            for name, stage in self._plan():
+                stats = {'stage': name, 'status': 'skipped', 'candidates': 0, 'seconds': 0.0, 'cracked': {}}
+                self.stages.append(stats)
+                if self._done():
+                    continue
+                stage_start = time.perf_counter()
+                with span(f'budget_{name}'):
+                    complete = stage(stats)
+                stats['seconds'] = time.perf_counter() - stage_start
+                stats['status'] = 'done' if complete or not self.remaining else 'stopped'
+                print(f"⏳ {name}: {len(stats['cracked'])} cracked from {stats['candidates']:,} candidates "
+                      f"in {stats['seconds']:.2f}s")
+            if not self.remaining:
+                stopped_by = 'all_cracked'
+            elif self.budget.expired():
+                stopped_by = self.budget.stop_reason()
+            else:
+                stopped_by = 'exhausted'
+
+        elapsed = time.perf_counter() - start
+        return dict(self.cracked), {
+            'time_budget': self.budget.seconds,
+            'max_candidates': self.budget.candidates,
+            'elapsed_seconds': round(elapsed, 3),
+            'candidates': self.budget.used,
+            'stopped_by': stopped_by,
+            'accounts': self._tier_counts(self.hash_users),
+            'cracked_accounts': self._tier_counts(self.cracked),
+            'stages': [self._stage_summary(s) for s in self.stages],
+        }
+
+    def _stage_summary(self, stats):
+        hits = len(stats['cracked'])
+        return {
+            'stage': stats['stage'],
+            'status': stats['status'],
+            'candidates': stats['candidates'],
+            'seconds': round(stats['seconds'], 3),
+            'cracked_hashes': hits,
+            'cracked_accounts': self._tier_counts(stats['cracked']),
+            'yield_per_million': round(hits / stats['candidates'] * 1e6, 2) if stats['candidates'] else 0.0,
+            'cracked_per_second': round(hits / stats['seconds'], 3) if stats['seconds'] else 0.0,
+        }
+
+def run_budgeted_audit(hashes_path=HASHES_PATH, wordlist_path=WORDLIST_PATH, users=None, user_info=None,
+                       time_budget=None, max_candidates=None, top_words=BUDGET_TOP_WORDS,
+                       rules=False, mask=None, hybrid_mask=None, processes=None):
+    """
+    Budgeted counterpart of evaluate_password_file_from_john.
+    users / user_info are the two dicts returned by load_users_from_ad and drive prioritization.
+    Returns (results rows, schedule stats).
+    """
+    with span('hash_load'):
+        user_hashes = load_user_hashes(hashes_path)
+    scheduler = AuditScheduler(user_hashes, users, user_info, wordlist_path, time_budget, max_candidates,
+                               top_words, rules, mask, hybrid_mask, processes)
+    cracked, stats = scheduler.run()
+    return score_results(user_hashes, cracked), stats
@@ -0,0 +1,186 @@
+"""
+Resumable cracking sessions.
+
+A CrackSession runs the attack stages (wordlist + rules, mask, hybrid) and
+periodically persists its exact position — rule index and wordlist byte
+offset, mask index, hybrid index — together with every hash cracked so far.
+Re-running with the same inputs picks up where the last run stopped, so a
+restart or crash only loses the work since the last checkpoint. Checkpoints
+hold cracked plaintexts, so a finished session's file is deleted.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from config import SESSION_DIR, CHECKPOINT_INTERVAL
+from crack_utils import (RULES, TargetSet, build_segments, crack_words, estimate_attack, keyspace,
+                         load_wordlist, run_attack)
+from metrics_utils import span, incr, gauge
+
+WORDLIST_BATCH = 50000
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class CrackSession:
+    def __init__(self, hashes_path, wordlist_path, rules=False, mask=None, hybrid_mask=None,
+                 processes=None, session_dir=SESSION_DIR, checkpoint_interval=CHECKPOINT_INTERVAL):
+        self.wordlist_path = wordlist_path
+        self.rules = RULES if rules else RULES[:1]
+        self.mask = mask
+        self.hybrid_mask = hybrid_mask
+        self.processes = processes
+        self.checkpoint_interval = checkpoint_interval
+
+        # Same hashes + wordlist + attack plan => same session file
+        fingerprint = json.dumps({
+            'hashes': _file_digest(hashes_path),
+            'wordlist': _file_digest(wordlist_path),
+            'rules': [name for name, _ in self.rules],
+            'mask': mask,
+            'hybrid_mask': hybrid_mask,
+        }, sort_keys=True)
+        self.session_id = hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+        self.path = os.path.join(session_dir, f"{self.session_id}.json") if session_dir else None
+
+        self.state = {
+            'session_id': self.session_id,
+            'stage': 'wordlist',
+            'rule_index': 0,
+            'wordlist_offset': 0,
+            'mask_index': 0,
+            'hybrid_index': 0,
+            'cracked': {},
+        }
+        self._last_save = time.monotonic()
+        self.resumed = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️ Ignoring unreadable checkpoint: {self.path}")
+            return False
+        if saved.get('session_id') != self.session_id:
+            return False
+        self.state.update(saved)
+        print(f"♻️ Resuming session {self.session_id} at stage '{self.state['stage']}' "
+              f"({len(self.state['cracked'])} already cracked)")
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.state['updated'] = time.time()
+        # Unique temp name so concurrent workers never write the same file
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+        self._last_save = time.monotonic()
+
+    def discard(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _maybe_save(self):
+        if time.monotonic() - self._last_save >= self.checkpoint_interval:
+            self.save()
+
+    def _advance(self, stage):
+        self.state['stage'] = stage
+        if stage == 'done':
+            self.discard()
+        else:
+            self.save()
+
+    def _record(self, found):
+        self.state['cracked'].update(found)
+        for h in found:
+            self._remaining.discard(h)
+
+    def run(self, hex_hashes):
+        """
+        Crack as many of hex_hashes as the attack plan allows.
+        Returns {hex_hash: password}.
+        """
+        self._remaining = set(hex_hashes) - self.state['cracked'].keys()
+        try:
+            if self.state['stage'] == 'wordlist':
+                self._run_wordlist()
+                self._advance('mask')
+            if self.state['stage'] == 'mask':
+                if self.mask and self._remaining:
+                    self._run_mask(f"Mask {self.mask}", 'mask_index', build_segments(self.mask))
+                self._advance('hybrid')
+            if self.state['stage'] == 'hybrid':
+                if self.hybrid_mask and self._remaining:
+                    segments = build_segments(self.hybrid_mask, load_wordlist(self.wordlist_path), mode='append')
+                    self._run_mask(f"Hybrid wordlist+{self.hybrid_mask}", 'hybrid_index', segments)
+                self._advance('done')
+        finally:
+            if self.state['stage'] != 'done':
+                self.save()
+        return dict(self.state['cracked'])
+
+    def _run_wordlist(self):
+        with open(self.wordlist_path, 'rb') as f:
+            while self.state['rule_index'] < len(self.rules) and self._remaining:
+                _, rule = self.rules[self.state['rule_index']]
+                targets = TargetSet(self._remaining)
+                f.seek(self.state['wordlist_offset'])
+                while True:
+                    with span('wordlist_load'):
+                        lines = []
+                        for _ in range(WORDLIST_BATCH):
+                            line = f.readline()
+                            if not line:
+                                break
+                            lines.append(line)
+                        words = [rule(w) for w in (l.decode('utf-8', 'ignore').strip() for l in lines) if w]
+                    if not lines:
+                        break
+                    start = time.perf_counter()
+                    with span('md4_hashing'):
+                        self._record(crack_words(words, targets))
+                    elapsed = time.perf_counter() - start
+                    incr('candidates_hashed', len(words))
+                    if elapsed > 0:
+                        gauge('hashes_per_second', round(len(words) / elapsed, 1))
+                    self.state['wordlist_offset'] = f.tell()
+                    self._maybe_save()
+                self.state['rule_index'] += 1
+                self.state['wordlist_offset'] = 0
+                self.save()
+
+    def _run_mask(self, label, index_key, segments):
+        estimate = estimate_attack(segments, self.processes)
+        left = keyspace(segments) - self.state[index_key]
+        eta = round(left / estimate['hashes_per_second'], 1) if estimate['hashes_per_second'] else None
+        print(f"🧮 {label}: {left:,} of {estimate['keyspace']:,} candidates left "
+              f"at ~{estimate['hashes_per_second']:,.0f} H/s ≈ {eta}s")
+
+        def progress(next_index, found):
+            self.state[index_key] = next_index
+            self._record(found)
+            self._maybe_save()
+
+        found, next_index = run_attack(segments, self._remaining, self.processes,
+                                       start_index=self.state[index_key], progress=progress,
+                                       should_stop=lambda: not self._remaining)
+        self.state[index_key] = next_index
+        self._record(found)
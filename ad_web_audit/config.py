@@ -10,3 +10,25 @@ BASE_DN = 'dc=mydomain,dc=local'
 HASHES_PATH = r"ntlm_hashes.txt"
 WORDLIST_PATH = r"wordlist.txt"
 
+# Timing spans / counters exposed on /metrics (set PASSAUDIT_METRICS=0 to disable at runtime)
+METRICS_ENABLED = True
+
+# Resumable cracking sessions: checkpoint files and how often (seconds) to write them.
+# Checkpoints contain cracked plaintexts: keep them in Flask's instance folder, never under static/
+SESSION_DIR = r"instance/sessions"
+CHECKPOINT_INTERVAL = 30
+
+# Shared state store (SQLite, WAL) for results, per-audit config, jobs and the directory cache,
+# plus uploaded hash files and PDF reports. All under Flask's instance folder, never static/
+STORE_PATH = r"instance/passaudit.db"
+AUDIT_DIR = r"instance/audits"
+REPORT_DIR = r"instance/reports"
+DIRECTORY_CACHE_TTL = 300
+
+# Budgeted audits: accounts matching these groups / OUs (case-insensitive) are attacked first,
+# and the first BUDGET_TOP_WORDS wordlist entries are tried before rules and the rest of the list
+PRIVILEGED_GROUPS = ['Domain Admins', 'Enterprise Admins', 'Schema Admins', 'Administrators',
+                     'Account Operators', 'Backup Operators', 'Server Operators', 'Print Operators',
+                     'Group Policy Creator Owners', 'DnsAdmins', 'Key Admins', 'Enterprise Key Admins']
+PRIVILEGED_OUS = ['Admins', 'Administrators', 'Tier 0', 'Domain Controllers', 'Service Accounts']
+BUDGET_TOP_WORDS = 10000
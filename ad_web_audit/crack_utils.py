@@ -0,0 +1,398 @@
+"""
+Mask and hybrid (wordlist + mask) brute-force attacks against NT hashes.
+
+Candidates are addressed by a single integer index into the keyspace, so a
+run can be chunked across processes or resumed from any index. Each
+batch of indices is decoded straight into a UTF-16LE MD4 message block
+(NumPy uint16/uint32 arrays) and hashed in one vectorized pass — no
+per-candidate str or bytes objects are created on the hot path.
+
+Mask syntax follows hashcat: ?l ?u ?d ?s ?a, ?1-?4 for custom charsets,
+?? for a literal '?', anything else is a literal character.
+"""
+
+import math
+import os
+import time
+from multiprocessing import get_context
+
+import numpy as np
+
+from metrics_utils import span, incr, gauge
+
+CHARSETS = {
+    'l': 'abcdefghijklmnopqrstuvwxyz',
+    'u': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    'd': '0123456789',
+    's': ' !"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~',
+}
+CHARSETS['a'] = CHARSETS['l'] + CHARSETS['u'] + CHARSETS['d'] + CHARSETS['s']
+
+BATCH_SIZE = 1 << 18       # candidates hashed per vectorized MD4 call
+CHUNK_SIZE = 1 << 22       # indices handed to a worker per task
+MAX_BLOCK_UNITS = 27       # UTF-16 code units that fit one MD4 block
+INDEX_LIMIT = 2**63 - 1    # batch indices are decoded as int64
+
+# === Keyspace construction ===
+
+def _slot(strings):
+    """
+    One mask position (or the wordlist) as a (radix, width) uint16 array of
+    UTF-16 code units. All strings in a slot must have the same encoded width.
+    """
+    encoded = [s.encode('utf-16le') for s in strings]
+    width = len(encoded[0]) // 2
+    return np.frombuffer(b''.join(encoded), dtype='<u2').reshape(len(encoded), width)
+
+def parse_mask(mask, custom_charsets=None):
+    """
+    Turn a mask like '?u?l?l?l?d?d?d?d' into a list of per-position charsets.
+    """
+    custom_charsets = custom_charsets or {}
+    positions = []
+    i = 0
+    while i < len(mask):
+        ch = mask[i]
+        if ch == '?':
+            if i + 1 >= len(mask):
+                raise ValueError("Mask ends with a dangling '?'")
+            key = mask[i + 1]
+            if key == '?':
+                charset = '?'
+            elif key in CHARSETS:
+                charset = CHARSETS[key]
+            elif key in custom_charsets:
+                charset = ''.join(dict.fromkeys(custom_charsets[key]))
+            else:
+                raise ValueError(f"Unknown mask placeholder: ?{key}")
+            i += 2
+        else:
+            charset = ch
+            i += 1
+        if any(len(c.encode('utf-16le')) != 2 for c in charset):
+            raise ValueError("Mask characters must be in the Basic Multilingual Plane")
+        positions.append(charset)
+    if not positions:
+        raise ValueError("Empty mask")
+    return positions
+
+def build_segments(mask, words=None, mode='mask', custom_charsets=None):
+    """
+    Build the keyspace as a list of segments, each a list of slots.
+    mode: 'mask'    -> mask only
+          'append'  -> word + mask  (hybrid, hashcat -a 6)
+          'prepend' -> mask + word  (hybrid, hashcat -a 7)
+    Hybrid words are grouped by encoded length so each segment has a fixed
+    candidate width; the global index walks the segments in order.
+    """
+    mask_slots = [_slot(list(charset)) for charset in parse_mask(mask, custom_charsets)]
+    if mode == 'mask':
+        return [mask_slots]
+    if mode not in ('append', 'prepend'):
+        raise ValueError(f"Unknown attack mode: {mode}")
+    if not words:
+        raise ValueError("Hybrid mode needs a wordlist")
+
+    by_width = {}
+    for w in dict.fromkeys(words):
+        by_width.setdefault(len(w.encode('utf-16le')) // 2, []).append(w)
+
+    segments = []
+    for width in sorted(by_width):
+        word_slot = _slot(by_width[width]) if width else np.zeros((1, 0), dtype='<u2')
+        segments.append([word_slot] + mask_slots if mode == 'append' else mask_slots + [word_slot])
+    return segments
+
+def segment_keyspace(segment):
+    return math.prod(slot.shape[0] for slot in segment)
+
+def keyspace(segments):
+    return sum(segment_keyspace(s) for s in segments)
+
+def _locate(segments, index):
+    """
+    Map a global index to (segment number, local index).
+    """
+    for n, seg in enumerate(segments):
+        size = segment_keyspace(seg)
+        if index < size:
+            return n, index
+        index -= size
+    raise IndexError("Index beyond keyspace")
+
+def candidate_at(segments, index):
+    """
+    Decode a single keyspace index back to its plaintext candidate.
+    """
+    n, local = _locate(segments, index)
+    parts = []
+    for slot in reversed(segments[n]):
+        local, digit = divmod(local, slot.shape[0])
+        parts.append(slot[digit].tobytes())
+    return b''.join(reversed(parts)).decode('utf-16le')
+
+# === Vectorized MD4 ===
+
+def _rotl(x, s):
+    return (x << np.uint32(s)) | (x >> np.uint32(32 - s))
+
+def md4_blocks(X):
+    """
+    MD4 over single-block messages. X is an (N, 16) uint32 array of already
+    padded blocks; returns (N, 4) uint32 state words (the digest, little-endian).
+    """
+    X = [X[:, i] for i in range(16)]
+    a = np.full(len(X[0]), 0x67452301, dtype=np.uint32)
+    b = np.full(len(X[0]), 0xefcdab89, dtype=np.uint32)
+    c = np.full(len(X[0]), 0x98badcfe, dtype=np.uint32)
+    d = np.full(len(X[0]), 0x10325476, dtype=np.uint32)
+    a0, b0, c0, d0 = a.copy(), b.copy(), c.copy(), d.copy()
+
+    with np.errstate(over='ignore'):
+        for i in (0, 4, 8, 12):
+            a = _rotl(a + ((b & c) | (~b & d)) + X[i], 3)
+            d = _rotl(d + ((a & b) | (~a & c)) + X[i + 1], 7)
+            c = _rotl(c + ((d & a) | (~d & b)) + X[i + 2], 11)
+            b = _rotl(b + ((c & d) | (~c & a)) + X[i + 3], 19)
+
+        k2 = np.uint32(0x5A827999)
+        for i in (0, 1, 2, 3):
+            a = _rotl(a + ((b & c) | (b & d) | (c & d)) + X[i] + k2, 3)
+            d = _rotl(d + ((a & b) | (a & c) | (b & c)) + X[i + 4] + k2, 5)
+            c = _rotl(c + ((d & a) | (d & b) | (a & b)) + X[i + 8] + k2, 9)
+            b = _rotl(b + ((c & d) | (c & a) | (d & a)) + X[i + 12] + k2, 13)
+
+        k3 = np.uint32(0x6ED9EBA1)
+        for i in (0, 2, 1, 3):
+            a = _rotl(a + (b ^ c ^ d) + X[i] + k3, 3)
+            d = _rotl(d + (a ^ b ^ c) + X[i + 8] + k3, 9)
+            c = _rotl(c + (d ^ a ^ b) + X[i + 4] + k3, 11)
+            b = _rotl(b + (c ^ d ^ a) + X[i + 12] + k3, 15)
+
+        return np.stack([a + a0, b + b0, c + c0, d + d0], axis=1)
+
+def _encode_batch(segment, start, count):
+    """
+    Decode indices [start, start+count) of a segment directly into padded
+    MD4 blocks: UTF-16LE code units, 0x80 terminator and bit length.
+    """
+    width = sum(slot.shape[1] for slot in segment)
+    units = np.zeros((count, 32), dtype='<u2')
+    idx = np.arange(start, start + count, dtype=np.int64)
+    col = width
+    for slot in reversed(segment):
+        idx, digit = np.divmod(idx, slot.shape[0])
+        col -= slot.shape[1]
+        if slot.shape[1]:
+            units[:, col:col + slot.shape[1]] = slot[digit]
+    units[:, width] = 0x0080
+    blocks = units.view('<u4')
+    blocks[:, 14] = width * 16
+    return blocks
+
+class TargetSet:
+    """
+    Target NT hashes as sorted first-words for a vectorized prefilter, plus the
+    full digests for confirmation.
+    """
+    def __init__(self, hex_hashes):
+        digests = sorted({bytes.fromhex(h) for h in hex_hashes if len(h) == 32})
+        self.digests = set(digests)
+        self.first = np.unique(np.array([int.from_bytes(d[:4], 'little') for d in digests], dtype=np.uint32))
+
+    def match(self, state):
+        hits = np.flatnonzero(np.isin(state[:, 0], self.first))
+        return [(int(i), state[i].astype('<u4').tobytes()) for i in hits
+                if state[i].astype('<u4').tobytes() in self.digests]
+
+def words_to_blocks(words):
+    """
+    Pack variable-length words (each <= MAX_BLOCK_UNITS UTF-16 units) into
+    padded MD4 blocks with a single scatter instead of per-word buffers.
+    """
+    encoded = [w.encode('utf-16le') for w in words]
+    lengths = np.array([len(e) // 2 for e in encoded], dtype=np.int64)
+    flat = np.frombuffer(b''.join(encoded), dtype='<u2')
+    rows = np.repeat(np.arange(len(words)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    cols = np.arange(len(flat)) - np.repeat(starts, lengths)
+
+    units = np.zeros((len(words), 32), dtype='<u2')
+    units[rows, cols] = flat
+    units[np.arange(len(words)), lengths] = 0x0080
+    blocks = units.view('<u4')
+    blocks[:, 14] = lengths * 16
+    return blocks
+
+def crack_words(words, targets):
+    """
+    Hash a batch of plaintext candidates and return {hex_hash: password} hits.
+    """
+    from eval_utils import ntlm_hash
+
+    found = {}
+    short = [w for w in words if len(w.encode('utf-16le')) <= 2 * MAX_BLOCK_UNITS]
+    if len(short) != len(words):
+        short_set = set(short)
+        for w in words:
+            if w not in short_set:
+                h = ntlm_hash(w)
+                if bytes.fromhex(h) in targets.digests:
+                    found[h] = w
+    for lo in range(0, len(short), BATCH_SIZE):
+        batch = short[lo:lo + BATCH_SIZE]
+        if batch:
+            for i, digest in targets.match(md4_blocks(words_to_blocks(batch))):
+                found[digest.hex()] = batch[i]
+    return found
+
+_wordlists = {}  # path -> ((mtime_ns, size), words)
+
+def load_wordlist(path):
+    """
+    Wordlist as a list of words, read on first use and reused until the file changes.
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _wordlists.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+    with span('wordlist_load'), open(path, 'r', encoding='utf-8') as f:
+        words = [line.strip() for line in f if line.strip()]
+    _wordlists[path] = (version, words)
+    return words
+
+# === Word-mangling rules (hashcat-style names, applied one at a time) ===
+
+_LEET = str.maketrans({'a': '@', 'e': '3', 'o': '0', 'i': '1', 's': '$'})
+
+RULES = [
+    (':', lambda w: w),
+    ('c', str.capitalize),
+    ('u', str.upper),
+    ('$1', lambda w: w + '1'),
+    ('$!', lambda w: w + '!'),
+    ('c $1', lambda w: w.capitalize() + '1'),
+    ('c $!', lambda w: w.capitalize() + '!'),
+    ('$123', lambda w: w + '123'),
+    ('c $123', lambda w: w.capitalize() + '123'),
+    ('c $1 $!', lambda w: w.capitalize() + '1!'),
+    ('r', lambda w: w[::-1]),
+    ('d', lambda w: w + w),
+    ('sa@ se3 so0 si1 s$', lambda w: w.translate(_LEET)),
+    ('c sa@ se3 so0 si1 s$', lambda w: w.capitalize().translate(_LEET)),
+]
+
+def _scan_scalar(segment, start, end, targets):
+    # Candidates too long for one MD4 block: hash one at a time
+    from eval_utils import ntlm_hash
+    found = {}
+    for local in range(start, end):
+        word = candidate_at([segment], local)
+        h = ntlm_hash(word)
+        if bytes.fromhex(h) in targets.digests:
+            found[h] = word
+    return found
+
+def scan_range(segments, start, end, targets):
+    """
+    Hash every candidate in global range [start, end). Returns {hex_hash: password}.
+    """
+    found = {}
+    offset = 0
+    for segment in segments:
+        size = segment_keyspace(segment)
+        lo, hi = max(start - offset, 0), min(end - offset, size)
+        if hi > INDEX_LIMIT:
+            raise ValueError("Keyspace segment too large for vectorized indexing; split the mask")
+        if lo < hi:
+            if sum(slot.shape[1] for slot in segment) > MAX_BLOCK_UNITS:
+                found.update(_scan_scalar(segment, lo, hi, targets))
+            else:
+                for batch_start in range(lo, hi, BATCH_SIZE):
+                    count = min(BATCH_SIZE, hi - batch_start)
+                    state = md4_blocks(_encode_batch(segment, batch_start, count))
+                    for i, digest in targets.match(state):
+                        found[digest.hex()] = candidate_at([segment], batch_start + i)
+        offset += size
+        if offset >= end:
+            break
+    return found
+
+# === Running an attack ===
+
+_worker_state = {}
+
+def _init_worker(segments, hex_hashes):
+    _worker_state['segments'] = segments
+    _worker_state['targets'] = TargetSet(hex_hashes)
+
+def _scan_task(bounds):
+    start, end = bounds
+    return end, scan_range(_worker_state['segments'], start, end, _worker_state['targets'])
+
+def run_attack(segments, hex_hashes, processes=None, start_index=0, end_index=None,
+               chunk_size=CHUNK_SIZE, progress=None, should_stop=None):
+    """
+    Run a mask/hybrid attack over [start_index, end_index).
+    progress(next_index, found_so_far) is called after each completed chunk in
+    index order, so next_index is always safe to resume from.
+    should_stop() is polled between chunks to end the run early.
+    Returns (found {hex_hash: password}, next_index).
+    """
+    total = keyspace(segments)
+    end_index = total if end_index is None else min(end_index, total)
+    hex_hashes = list(hex_hashes)
+    processes = processes or os.cpu_count() or 1
+    # Lazy: a large mask has billions of chunks; map/imap pull them as workers free up
+    chunks = ((lo, min(lo + chunk_size, end_index)) for lo in range(start_index, end_index, chunk_size))
+
+    found = {}
+    next_index = start_index
+    start = time.perf_counter()
+    with span('mask_attack'):
+        if processes == 1 or end_index - start_index <= chunk_size:
+            _init_worker(segments, hex_hashes)
+            results = map(_scan_task, chunks)
+            pool = None
+        else:
+            pool = get_context('spawn').Pool(processes, initializer=_init_worker,
+                                             initargs=(segments, hex_hashes))
+            results = pool.imap(_scan_task, chunks)
+        try:
+            for chunk_end, chunk_found in results:
+                incr('candidates_hashed', chunk_end - next_index)
+                next_index = chunk_end
+                found.update(chunk_found)
+                if progress:
+                    progress(next_index, found)
+                if should_stop and should_stop():
+                    break
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+
+    elapsed = time.perf_counter() - start
+    if elapsed > 0 and next_index > start_index:
+        gauge('hashes_per_second', round((next_index - start_index) / elapsed, 1))
+    return found, next_index
+
+def estimate_attack(segments, processes=None, sample=BATCH_SIZE):
+    """
+    Keyspace and time-to-completion, measured by hashing one sample batch.
+    """
+    total = keyspace(segments)
+    processes = processes or os.cpu_count() or 1
+    probe = min(sample, total)
+    targets = TargetSet([])
+    start = time.perf_counter()
+    scan_range(segments, 0, probe, targets)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    rate = probe / elapsed * processes
+    return {
+        'keyspace': total,
+        'processes': processes,
+        'hashes_per_second': round(rate, 1),
+        'estimated_seconds': round(total / rate, 1) if rate else None,
+    }
@@ -1,14 +1,28 @@
 ﻿import hashlib
 import re
-from config import HASHES_PATH, WORDLIST_PATH
-from Crypto.Hash import MD4
+from config import HASHES_PATH, WORDLIST_PATH, SESSION_DIR
+from metrics_utils import span, incr
+
+# Scoring tables, compiled once at import and shared by every call
+CHARACTER_CLASSES = (
+    (re.compile(r'[a-z]'), "Missing lowercase"),
+    (re.compile(r'[A-Z]'), "Missing uppercase"),
+    (re.compile(r'[0-9]'), "Missing digit"),
+    (re.compile(r'[^A-Za-z0-9]'), "Missing symbol"),
+)
+COMMON_SEQUENCES = ('1234', 'abcd', 'qwerty', 'password', '1111', '0000')
+
+_MD4 = None  # Crypto.Hash.MD4, loaded by ntlm_hash on first call
 
 def ntlm_hash(password):
     """
     Generate NTLM hash using MD4 over UTF-16LE encoding.
     Pure Python, no external executables required.
     """
-    h = MD4.new()
+    global _MD4
+    if _MD4 is None:
+        from Crypto.Hash import MD4 as _MD4  # imported on first use, then reused
+    h = _MD4.new()
     h.update(password.encode('utf-16le'))
     return h.hexdigest().lower()
 
@@ -34,35 +48,21 @@ def evaluate_password(username, password):
         entropy += 50
 
     # === Regex checks ===
-    if re.search(r'[a-z]', password):
-        entropy += 10
-    else:
-        reasons.append("Missing lowercase")
-
-    if re.search(r'[A-Z]', password):
-        entropy += 10
-    else:
-        reasons.append("Missing uppercase")
-
-    if re.search(r'[0-9]', password):
-        entropy += 10
-    else:
-        reasons.append("Missing digit")
-
-    if re.search(r'[^A-Za-z0-9]', password):
-        entropy += 10
-    else:
-        reasons.append("Missing symbol")
+    for pattern, missing in CHARACTER_CLASSES:
+        if pattern.search(password):
+            entropy += 10
+        else:
+            reasons.append(missing)
 
     # === Username in password ===
-    if username.lower() in password.lower():
+    lowered = password.lower()
+    if username.lower() in lowered:
         entropy -= 15
         reasons.append("Contains username")
 
     # === Pattern detection ===
-    sequences = ['1234', 'abcd', 'qwerty', 'password', '1111', '0000']
-    for seq in sequences:
-        if seq in password.lower():
+    for seq in COMMON_SEQUENCES:
+        if seq in lowered:
             entropy -= 10
             reasons.append(f"Contains common pattern: {seq}")
             break
@@ -81,36 +81,58 @@ def evaluate_password(username, password):
     reason_text = ", ".join(reasons) if reasons else "Passes all checks"
     return entropy, status, reason_text
 
-def evaluate_password_file_from_john():
+def load_user_hashes(path=HASHES_PATH):
     """
-    Simulate cracking NTLM hashes using a wordlist in pure Python.
-    Evaluate strength with strict enterprise rules.
-    Output: List of (username, password, status, score, reason)
+    Parse a username:hash file into {username: nt_hash}.
     """
     user_hashes = {}
-    with open(HASHES_PATH, 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         for line in f:
             parts = line.strip().split(':')
             if len(parts) >= 2:
                 username = parts[0].strip()
                 hash_part = parts[1].strip().lower().replace('$nt$', '')
                 user_hashes[username] = hash_part
+    return user_hashes
+
+def evaluate_password_file_from_john(hashes_path=HASHES_PATH, wordlist_path=WORDLIST_PATH,
+                                     mask=None, hybrid_mask=None, processes=None,
+                                     rules=False, session_dir=SESSION_DIR):
+    """
+    Simulate cracking NTLM hashes using a wordlist (optionally mangled by rules)
+    in pure Python, optionally followed by a mask attack (e.g. '?u?l?l?l?d?d?d?d')
+    and a hybrid wordlist+mask attack on whatever is still uncracked.
+    Progress is checkpointed under session_dir so an interrupted run resumes;
+    pass session_dir=None for a throwaway run.
+    Evaluate strength with strict enterprise rules.
+    Output: List of (username, password, status, score, reason)
+    """
+    from checkpoint_utils import CrackSession  # cracking engine (NumPy) loads on first evaluation
 
-    with open(WORDLIST_PATH, 'r', encoding='utf-8') as f:
-        wordlist = [line.strip() for line in f if line.strip()]
+    with span('hash_load'):
+        user_hashes = load_user_hashes(hashes_path)
 
-    cracked = {}
-    for word in wordlist:
-        h = ntlm_hash(word)
-        cracked[h] = word
+    session = CrackSession(hashes_path, wordlist_path, rules=rules, mask=mask, hybrid_mask=hybrid_mask,
+                           processes=processes, session_dir=session_dir)
+    cracked = session.run(set(user_hashes.values()))
+    return score_results(user_hashes, cracked)
 
+def score_results(user_hashes, cracked):
+    """
+    Turn {username: nt_hash} plus {nt_hash: password} hits into
+    (username, password, status, score, reason) rows.
+    """
     results = []
-    for user, stored_hash in user_hashes.items():
-        password = cracked.get(stored_hash)
-        if password:
-            score, status, reason = evaluate_password(user, password)
-            results.append((user, password, status, score, reason))
-        else:
-            results.append((user, "—", "Uncracked", 0, "Password not cracked"))
+    cracked_count = 0
+    with span('scoring'):
+        for user, stored_hash in user_hashes.items():
+            password = cracked.get(stored_hash)
+            if password:
+                cracked_count += 1
+                score, status, reason = evaluate_password(user, password)
+                results.append((user, password, status, score, reason))
+            else:
+                results.append((user, "—", "Uncracked", 0, "Password not cracked"))
+    incr('accounts_cracked', cracked_count)
 
     return results
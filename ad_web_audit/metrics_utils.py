@@ -0,0 +1,253 @@
+"""
+Lightweight hot-path instrumentation: timing spans, counters and gauges,
+rendered in Prometheus text format for /metrics and collected per job.
+
+When disabled (METRICS_ENABLED = False in config.py, or PASSAUDIT_METRICS=0),
+span() hands back a shared no-op context manager and incr()/gauge() return
+immediately, so instrumented code pays only a function call.
+
+The registries are per process. Under several workers each one publishes its
+snapshot() to the shared store and /metrics renders merge_snapshots() of all
+of them, so the numbers cover every worker, not just the one that answered.
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows: fall back to psutil if installed, else RSS reads as 0
+    resource = None
+
+try:
+    from config import METRICS_ENABLED
+except ImportError:
+    METRICS_ENABLED = True
+
+ENABLED = METRICS_ENABLED and os.environ.get('PASSAUDIT_METRICS', '1') != '0'
+PREFIX = 'passaudit'
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans = {}      # stage -> [calls, total_seconds, max_seconds]
+_counters = {}   # name -> value
+_gauges = {}     # name -> value
+_rss_high_water = {}  # stage -> bytes
+
+COUNTER_HELP = {
+    'candidates_hashed': 'Password candidates hashed with MD4',
+    'accounts_cracked': 'Accounts whose NT hash was cracked',
+    'ldap_round_trips': 'LDAP operations sent to the directory',
+    'ldap_bytes_sent': 'Bytes sent to the LDAP server',
+    'ldap_bytes_received': 'Bytes received from the LDAP server',
+}
+GAUGE_HELP = {
+    'hashes_per_second': 'MD4 hash rate of the most recent cracking run',
+}
+
+_process = None
+_worker = (None, None)  # (pid, worker id)
+
+def worker_id():
+    """
+    Stable id for this process; a restarted or forked worker gets a new one.
+    """
+    global _worker
+    pid = os.getpid()
+    if _worker[0] != pid:
+        _worker = (pid, f"{socket.gethostname()}:{pid}:{time.time():.0f}")
+    return _worker[1]
+
+def rss_high_water_bytes():
+    """
+    Peak RSS of this process in bytes; 0 where it cannot be measured.
+    """
+    global _process
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+    if _process is None:
+        try:
+            import psutil
+            _process = psutil.Process()
+        except ImportError:
+            _process = False
+    if not _process:
+        return 0
+    info = _process.memory_info()
+    return getattr(info, 'peak_wset', info.rss)
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopSpan()
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        rss = rss_high_water_bytes()
+        with _lock:
+            stat = _spans.get(self.name)
+            if stat is None:
+                stat = _spans[self.name] = [0, 0.0, 0.0]
+            stat[0] += 1
+            stat[1] += elapsed
+            stat[2] = max(stat[2], elapsed)
+            _rss_high_water[self.name] = max(_rss_high_water.get(self.name, 0), rss)
+        job = getattr(_local, 'job', None)
+        if job is not None:
+            job['stages'][self.name] = job['stages'].get(self.name, 0.0) + elapsed
+        return False
+
+def span(name):
+    """
+    Time a stage: `with span('ldap_search'): ...`
+    """
+    if not ENABLED:
+        return _NOOP
+    return _Span(name)
+
+def incr(name, value=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+    job = getattr(_local, 'job', None)
+    if job is not None:
+        job['counters'][name] = job['counters'].get(name, 0) + value
+
+def gauge(name, value):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[name] = value
+    job = getattr(_local, 'job', None)
+    if job is not None:
+        job['gauges'][name] = value
+
+@contextmanager
+def job():
+    """
+    Collect a per-job timing breakdown for spans/counters on this thread.
+    Yields a dict that is filled in when the block exits.
+    """
+    breakdown = {'stages': {}, 'counters': {}, 'gauges': {}}
+    if not ENABLED:
+        yield breakdown
+        return
+
+    previous = getattr(_local, 'job', None)
+    _local.job = breakdown
+    start = time.perf_counter()
+    try:
+        yield breakdown
+    finally:
+        _local.job = previous
+        breakdown['total_seconds'] = round(time.perf_counter() - start, 6)
+        breakdown['stages'] = {k: round(v, 6) for k, v in breakdown['stages'].items()}
+        breakdown['peak_rss_mb'] = round(rss_high_water_bytes() / (1024 * 1024), 1)
+
+def record_ldap_usage(conn):
+    """
+    Fold an ldap3 connection's usage statistics (collect_usage=True) into the counters.
+    """
+    usage = getattr(conn, 'usage', None)
+    if not ENABLED or usage is None:
+        return
+    incr('ldap_round_trips', usage.operations)
+    incr('ldap_bytes_sent', usage.bytes_transmitted)
+    incr('ldap_bytes_received', usage.bytes_received)
+
+def snapshot():
+    """
+    This process's registries as a JSON-serialisable dict.
+    """
+    with _lock:
+        return {
+            'spans': {k: list(v) for k, v in _spans.items()},
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'rss_by_stage': dict(_rss_high_water),
+            'rss': rss_high_water_bytes(),
+            'time': time.time(),
+        }
+
+def merge_snapshots(snapshots):
+    """
+    Combine per-worker snapshots: counters and span totals add up, maxima take
+    the max, and each gauge keeps the value from the most recent snapshot.
+    """
+    merged = {'spans': {}, 'counters': {}, 'gauges': {}, 'rss_by_stage': {}, 'rss': 0}
+    for snap in sorted(snapshots, key=lambda s: s.get('time', 0)):
+        for stage, (calls, total, worst) in snap.get('spans', {}).items():
+            stat = merged['spans'].setdefault(stage, [0, 0.0, 0.0])
+            stat[0] += calls
+            stat[1] += total
+            stat[2] = max(stat[2], worst)
+        for name, value in snap.get('counters', {}).items():
+            merged['counters'][name] = merged['counters'].get(name, 0) + value
+        merged['gauges'].update(snap.get('gauges', {}))
+        for stage, rss in snap.get('rss_by_stage', {}).items():
+            merged['rss_by_stage'][stage] = max(merged['rss_by_stage'].get(stage, 0), rss)
+        merged['rss'] = max(merged['rss'], snap.get('rss', 0))
+    return merged
+
+def render_prometheus(snap=None):
+    """
+    Prometheus text for a (merged) snapshot; defaults to this process alone.
+    """
+    snap = snap or snapshot()
+    spans, counters, gauges = snap['spans'], snap['counters'], snap['gauges']
+    rss_by_stage = snap['rss_by_stage']
+    lines = []
+
+    lines.append(f"# HELP {PREFIX}_stage_seconds_total Time spent per pipeline stage")
+    lines.append(f"# TYPE {PREFIX}_stage_seconds_total counter")
+    for stage, (calls, total, _) in sorted(spans.items()):
+        lines.append(f'{PREFIX}_stage_seconds_total{{stage="{stage}"}} {total:.6f}')
+    lines.append(f"# HELP {PREFIX}_stage_calls_total Number of times each stage ran")
+    lines.append(f"# TYPE {PREFIX}_stage_calls_total counter")
+    for stage, (calls, _, _) in sorted(spans.items()):
+        lines.append(f'{PREFIX}_stage_calls_total{{stage="{stage}"}} {calls}')
+    lines.append(f"# HELP {PREFIX}_stage_seconds_max Slowest single run of each stage")
+    lines.append(f"# TYPE {PREFIX}_stage_seconds_max gauge")
+    for stage, (_, _, worst) in sorted(spans.items()):
+        lines.append(f'{PREFIX}_stage_seconds_max{{stage="{stage}"}} {worst:.6f}')
+    lines.append(f"# HELP {PREFIX}_stage_rss_high_water_bytes Largest process RSS high-water mark seen at the end of each stage")
+    lines.append(f"# TYPE {PREFIX}_stage_rss_high_water_bytes gauge")
+    for stage, rss in sorted(rss_by_stage.items()):
+        lines.append(f'{PREFIX}_stage_rss_high_water_bytes{{stage="{stage}"}} {rss}')
+
+    for name, help_text in COUNTER_HELP.items():
+        lines.append(f"# HELP {PREFIX}_{name}_total {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+        lines.append(f"{PREFIX}_{name}_total {counters.get(name, 0)}")
+    for name, help_text in GAUGE_HELP.items():
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} gauge")
+        lines.append(f"{PREFIX}_{name} {gauges.get(name, 0)}")
+
+    lines.append(f"# HELP {PREFIX}_rss_high_water_bytes Largest resident memory high-water mark of any worker")
+    lines.append(f"# TYPE {PREFIX}_rss_high_water_bytes gauge")
+    lines.append(f"{PREFIX}_rss_high_water_bytes {snap['rss']}")
+    lines.append(f"# HELP {PREFIX}_metrics_enabled Whether instrumentation is active")
+    lines.append(f"# TYPE {PREFIX}_metrics_enabled gauge")
+    lines.append(f"{PREFIX}_metrics_enabled {int(ENABLED)}")
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,4 @@
-fetch("/static/data/eval_results.json")
+fetch("/api/results")
   .then(res => {
     if (!res.ok) throw new Error("No evaluation data found.");
     return res.json();
@@ -0,0 +1,230 @@
+"""
+Shared local state store (SQLite in WAL mode).
+
+Evaluation results, prebuilt analytics frames, connection config (minus the
+bind password), job state and the directory cache are keyed per audit (metrics
+snapshots per worker process), so several worker processes and several analysts
+can run separate audits at once without overwriting each other's files. WAL
+lets readers proceed while a writer commits; busy_timeout absorbs short
+write contention between workers.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from config import STORE_PATH
+
+_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audits (
+    audit_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    audit_id TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    audit_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    error TEXT,
+    timing TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_audit ON jobs (audit_id, started);
+CREATE TABLE IF NOT EXISTS directory_cache (
+    cache_key TEXT PRIMARY KEY,
+    fetched REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS analytics_frames (
+    audit_id TEXT PRIMARY KEY,
+    version REAL NOT NULL,
+    directory TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    worker_id TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+def get_db(path=STORE_PATH):
+    """
+    One connection per thread (and per process); created and migrated lazily.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != path:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.executescript(SCHEMA)
+        _local.conn, _local.path = conn, path
+    return conn
+
+# === Audits and config ===
+
+def new_audit_id():
+    audit_id = uuid.uuid4().hex
+    get_db().execute("INSERT INTO audits (audit_id, created) VALUES (?, ?)", (audit_id, time.time()))
+    return audit_id
+
+def save_config(audit_id, config):
+    # The bind password is never written to disk; callers keep it in the session cookie
+    config = {k: v for k, v in config.items() if k != 'PASSWORD'}
+    get_db().execute(
+        "INSERT INTO audits (audit_id, created, config) VALUES (?, ?, ?) "
+        "ON CONFLICT(audit_id) DO UPDATE SET config = excluded.config",
+        (audit_id, time.time(), json.dumps(config)))
+
+def load_config(audit_id):
+    row = get_db().execute("SELECT config FROM audits WHERE audit_id = ?", (audit_id,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+# === Evaluation results ===
+
+def save_results(audit_id, results):
+    """
+    Returns the new results version (its `updated` timestamp).
+    """
+    updated = time.time()
+    get_db().execute(
+        "INSERT INTO results (audit_id, updated, data) VALUES (?, ?, ?) "
+        "ON CONFLICT(audit_id) DO UPDATE SET updated = excluded.updated, data = excluded.data",
+        (audit_id, updated, json.dumps(results)))
+    return updated
+
+def load_results(audit_id):
+    """
+    Returns (results list, updated timestamp) or (None, None).
+    """
+    row = get_db().execute("SELECT data, updated FROM results WHERE audit_id = ?", (audit_id,)).fetchone()
+    if not row:
+        return None, None
+    return json.loads(row[0]), row[1]
+
+def results_version(audit_id):
+    row = get_db().execute("SELECT updated FROM results WHERE audit_id = ?", (audit_id,)).fetchone()
+    return row[0] if row else None
+
+# === Jobs ===
+
+def start_job(audit_id, kind):
+    job_id = uuid.uuid4().hex
+    get_db().execute(
+        "INSERT INTO jobs (job_id, audit_id, kind, status, started) VALUES (?, ?, ?, 'running', ?)",
+        (job_id, audit_id, kind, time.time()))
+    return job_id
+
+def finish_job(job_id, status, error=None, timing=None):
+    get_db().execute(
+        "UPDATE jobs SET status = ?, finished = ?, error = ?, timing = ? WHERE job_id = ?",
+        (status, time.time(), error, json.dumps(timing) if timing is not None else None, job_id))
+
+def get_job(job_id, audit_id):
+    row = get_db().execute(
+        "SELECT job_id, kind, status, started, finished, error, timing FROM jobs "
+        "WHERE job_id = ? AND audit_id = ?", (job_id, audit_id)).fetchone()
+    if not row:
+        return None
+    keys = ['job_id', 'kind', 'status', 'started', 'finished', 'error', 'timing']
+    job = dict(zip(keys, row))
+    job['timing'] = json.loads(job['timing']) if job['timing'] else None
+    return job
+
+def list_jobs(audit_id, limit=20):
+    rows = get_db().execute(
+        "SELECT job_id FROM jobs WHERE audit_id = ? ORDER BY started DESC LIMIT ?", (audit_id, limit)).fetchall()
+    return [get_job(r[0], audit_id) for r in rows]
+
+# === Directory cache ===
+
+def _encode_dates(user_info):
+    return {u: {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in info.items()}
+            for u, info in user_info.items()}
+
+def _decode_dates(user_info):
+    for info in user_info.values():
+        for k in ('lastLogon', 'pwdLastSet'):
+            if info.get(k):
+                info[k] = datetime.fromisoformat(info[k])
+    return user_info
+
+def cache_directory(cache_key, users, user_info):
+    payload = json.dumps({'users': users, 'user_info': _encode_dates(user_info)})
+    get_db().execute(
+        "INSERT INTO directory_cache (cache_key, fetched, data) VALUES (?, ?, ?) "
+        "ON CONFLICT(cache_key) DO UPDATE SET fetched = excluded.fetched, data = excluded.data",
+        (cache_key, time.time(), payload))
+
+def cached_directory(cache_key, max_age):
+    """
+    Returns (users, user_info) if cached within max_age seconds, else None.
+    """
+    row = get_db().execute(
+        "SELECT data, fetched FROM directory_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+    if not row or time.time() - row[1] > max_age:
+        return None
+    data = json.loads(row[0])
+    return data['users'], _decode_dates(data['user_info'])
+
+def directory_fetched(cache_key):
+    """
+    When the cached directory was fetched (even if past its TTL), or None.
+    """
+    row = get_db().execute("SELECT fetched FROM directory_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+    return row[0] if row else None
+
+def invalidate_directory(cache_key):
+    get_db().execute("DELETE FROM directory_cache WHERE cache_key = ?", (cache_key,))
+
+# === Analytics frames ===
+
+def save_frame(audit_id, version, directory, data):
+    """
+    Store the serialized analytics frame built from results `version` and
+    directory snapshot `directory`; one frame per audit.
+    """
+    get_db().execute(
+        "INSERT INTO analytics_frames (audit_id, version, directory, data) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(audit_id) DO UPDATE SET version = excluded.version, "
+        "directory = excluded.directory, data = excluded.data",
+        (audit_id, version, directory, sqlite3.Binary(data)))
+
+def load_frame(audit_id, version, directory):
+    """
+    The stored frame bytes if they were built from exactly these inputs, else None.
+    """
+    row = get_db().execute(
+        "SELECT data FROM analytics_frames WHERE audit_id = ? AND version = ? AND directory = ?",
+        (audit_id, version, directory)).fetchone()
+    return bytes(row[0]) if row else None
+
+# === Metrics ===
+
+def publish_metrics(worker_id, snapshot):
+    """
+    Store one worker's metrics snapshot. Rows of exited workers are kept, so
+    the merged counters never go backwards.
+    """
+    get_db().execute(
+        "INSERT INTO metrics (worker_id, updated, data) VALUES (?, ?, ?) "
+        "ON CONFLICT(worker_id) DO UPDATE SET updated = excluded.updated, data = excluded.data",
+        (worker_id, time.time(), json.dumps(snapshot)))
+
+def load_metrics():
+    return [json.loads(r[0]) for r in get_db().execute("SELECT data FROM metrics").fetchall()]
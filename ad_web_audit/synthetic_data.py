@@ -0,0 +1,168 @@
+"""
+Deterministic synthetic AD population for benchmarks.
+
+Produces N users spread over OUs and groups, an NT-hash file with a
+configurable crack rate (passwords drawn from the wordlist) and reuse rate
+(passwords copied from an earlier user), and a wordlist of configurable size.
+The same seed always yields byte-identical files.
+"""
+
+import json
+import os
+import random
+import string
+from datetime import datetime, timedelta
+
+from eval_utils import ntlm_hash
+
+OUS = ['IT', 'HR', 'Finance', 'Sales', 'Marketing', 'Engineering', 'Support', 'Legal', 'Operations', 'Admins']
+GROUPS = ['Domain Users', 'VPN Users', 'Remote Desktop Users', 'Finance Share', 'Helpdesk',
+          'Developers', 'Backup Operators', 'Domain Admins', 'Print Operators', 'Contractors']
+GIVEN_NAMES = ['Ahmad', 'Sara', 'Omar', 'Lina', 'Yousef', 'Maya', 'Karim', 'Noor', 'Ali', 'Huda']
+SURNAMES = ['Haddad', 'Khalil', 'Nasser', 'Saleh', 'Mansour', 'Aziz', 'Hamdan', 'Rahman', 'Farah', 'Issa']
+BASE_WORDS = ['password', 'welcome', 'summer', 'winter', 'spring', 'autumn', 'dragon', 'monkey',
+              'football', 'company', 'letmein', 'qwerty', 'sunshine', 'princess', 'admin', 'secret']
+
+REFERENCE_DATE = datetime(2025, 8, 1)
+BASE_DN = 'dc=bench,dc=local'
+
+def to_filetime(dt):
+    return int((dt - datetime(1601, 1, 1)).total_seconds() * 10**7)
+
+def generate_wordlist(size, rng):
+    """
+    Wordlist of `size` unique, realistic-looking candidates.
+    """
+    words = []
+    seen = set()
+    i = 0
+    while len(words) < size:
+        base = BASE_WORDS[i % len(BASE_WORDS)]
+        variant = i // len(BASE_WORDS)
+        style = variant % 4
+        if style == 0:
+            word = f"{base}{variant}"
+        elif style == 1:
+            word = f"{base.capitalize()}{1990 + variant % 40}"
+        elif style == 2:
+            word = f"{base.capitalize()}{variant}!"
+        else:
+            word = f"{base}{rng.randint(0, 99999)}"
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+        i += 1
+    return words
+
+def _strong_password(rng):
+    alphabet = string.ascii_letters + string.digits + '!@#$%^&*'
+    return ''.join(rng.choice(alphabet) for _ in range(18))
+
+def generate_users(n_users, wordlist, crack_rate=0.3, reuse_rate=0.1, seed=1337):
+    """
+    Returns a list of user dicts with username, dn, ou, groups, names,
+    FILETIME timestamps and the plaintext password.
+    """
+    rng = random.Random(seed)
+    users = []
+    cracked_pool, uncracked_pool = [], []
+
+    for i in range(n_users):
+        is_admin = i % 200 == 0
+        username = f"adm{i:07d}" if is_admin else f"user{i:07d}"
+        ou = 'Admins' if is_admin else OUS[rng.randrange(len(OUS) - 1)]
+        groups = ['Domain Users'] + rng.sample(GROUPS[1:7], rng.randint(0, 3))
+        if is_admin:
+            groups.append('Domain Admins')
+
+        cracked = rng.random() < crack_rate
+        pool = cracked_pool if cracked else uncracked_pool
+        if pool and rng.random() < reuse_rate:
+            password = pool[rng.randrange(len(pool))]
+        else:
+            password = wordlist[rng.randrange(len(wordlist))] if cracked else _strong_password(rng)
+            pool.append(password)
+
+        last_logon = REFERENCE_DATE - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1439))
+        pwd_set = REFERENCE_DATE - timedelta(days=rng.randint(0, 400), minutes=rng.randint(0, 1439))
+        users.append({
+            'username': username,
+            'dn': f"CN={username},OU={ou},{BASE_DN}",
+            'ou': ou,
+            'groups': groups,
+            'givenName': GIVEN_NAMES[rng.randrange(len(GIVEN_NAMES))],
+            'sn': SURNAMES[rng.randrange(len(SURNAMES))],
+            'lastLogonTimestamp': to_filetime(last_logon),
+            'pwdLastSet': to_filetime(pwd_set),
+            'password': password,
+        })
+    return users
+
+def generate_dataset(out_dir, n_users, crack_rate=0.3, reuse_rate=0.1, wordlist_size=10000, seed=1337):
+    """
+    Write wordlist.txt, ntlm_hashes.txt and users.json under out_dir.
+    Returns a dict of the generated paths and parameters.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    wordlist = generate_wordlist(wordlist_size, rng)
+    users = generate_users(n_users, wordlist, crack_rate, reuse_rate, seed)
+
+    wordlist_path = os.path.join(out_dir, 'wordlist.txt')
+    with open(wordlist_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(wordlist) + '\n')
+
+    hash_cache = {}
+    hashes_path = os.path.join(out_dir, 'ntlm_hashes.txt')
+    with open(hashes_path, 'w', encoding='utf-8') as f:
+        for u in users:
+            pw = u['password']
+            h = hash_cache.get(pw)
+            if h is None:
+                h = hash_cache[pw] = ntlm_hash(pw)
+            f.write(f"{u['username']}:{h}\n")
+
+    users_path = os.path.join(out_dir, 'users.json')
+    with open(users_path, 'w', encoding='utf-8') as f:
+        json.dump(users, f)
+
+    return {
+        'dir': out_dir,
+        'wordlist_path': wordlist_path,
+        'hashes_path': hashes_path,
+        'users_path': users_path,
+        'n_users': n_users,
+        'crack_rate': crack_rate,
+        'reuse_rate': reuse_rate,
+        'wordlist_size': wordlist_size,
+        'seed': seed,
+    }
+
+def mock_ldap_connection(users, base_dn=BASE_DN):
+    """
+    Bound ldap3 MOCK_SYNC connection populated with the synthetic users.
+    Entries live on the returned server, so further connections can share them.
+    """
+    from ldap3 import Server, Connection, MOCK_SYNC, OFFLINE_AD_2012_R2
+
+    server = Server('mock_dc', get_info=OFFLINE_AD_2012_R2)
+    bind_dn = f"CN=Administrator,CN=Users,{base_dn}"
+    conn = Connection(server, user=bind_dn, password='benchmark', client_strategy=MOCK_SYNC)
+    conn.strategy.add_entry(bind_dn, {'userPassword': 'benchmark', 'objectClass': ['top', 'person']})
+    conn.strategy.add_entry(base_dn, {'objectClass': ['top', 'domain'], 'minPwdLength': 7,
+                                      'pwdHistoryLength': 24, 'lockoutThreshold': 0})
+
+    for u in users:
+        conn.strategy.add_entry(u['dn'], {
+            'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+            'sAMAccountName': u['username'],
+            'givenName': u['givenName'],
+            'sn': u['sn'],
+            'lastLogonTimestamp': str(u['lastLogonTimestamp']),
+            'pwdLastSet': str(u['pwdLastSet']),
+            'memberOf': [f"CN={g},CN=Users,{base_dn}" for g in u['groups']],
+        })
+
+    if not conn.bind():
+        raise Exception(f"❌ Mock LDAP bind failed: {conn.result}")
+    return conn
@@ -0,0 +1,71 @@
+"""
+Checks the vectorized MD4 and keyspace decoding in crack_utils against
+eval_utils.ntlm_hash. Run from ad_web_audit/: python -m pytest -q
+"""
+
+import random
+
+import numpy as np
+
+from crack_utils import (MAX_BLOCK_UNITS, TargetSet, _encode_batch, build_segments, candidate_at,
+                         crack_words, md4_blocks, scan_range, segment_keyspace, words_to_blocks)
+from eval_utils import ntlm_hash
+
+ALPHABET = 'abcXYZ019!@ éßüЖж€中文'  # ASCII plus non-ASCII BMP characters
+
+def _hex(state_row):
+    return state_row.astype('<u4').tobytes().hex()
+
+def test_md4_blocks_matches_ntlm_hash_for_every_block_length():
+    rng = random.Random(7)
+    words = [''.join(rng.choice(ALPHABET) for _ in range(n))
+             for n in range(1, MAX_BLOCK_UNITS + 1) for _ in range(3)]
+    state = md4_blocks(words_to_blocks(words))
+    for word, row in zip(words, state):
+        assert _hex(row) == ntlm_hash(word), word
+
+def test_crack_words_scalar_fallback_for_long_candidates():
+    long_word = 'Ж' + 'x' * MAX_BLOCK_UNITS  # one unit past a single block
+    short_word = 'Pässword1'
+    targets = TargetSet([ntlm_hash(long_word), ntlm_hash(short_word)])
+    found = crack_words([long_word, 'decoy', short_word], targets)
+    assert found == {ntlm_hash(long_word): long_word, ntlm_hash(short_word): short_word}
+
+def test_scan_range_scalar_fallback_for_long_masks():
+    mask = 'a' * MAX_BLOCK_UNITS + '?d'
+    segments = build_segments(mask)
+    target = 'a' * MAX_BLOCK_UNITS + '7'
+    found = scan_range(segments, 0, 10, TargetSet([ntlm_hash(target)]))
+    assert found == {ntlm_hash(target): target}
+
+def _assert_round_trip(segments):
+    offset = 0
+    for segment in segments:
+        size = segment_keyspace(segment)
+        count = min(size, 64)
+        start = size - count  # exercise the high digits too
+        blocks = _encode_batch(segment, start, count)
+        units = blocks.view('<u2')
+        state = md4_blocks(blocks)
+        for i in range(count):
+            word = candidate_at(segments, offset + start + i)
+            width = len(word.encode('utf-16le')) // 2
+            assert units[i, :width].tobytes().decode('utf-16le') == word
+            assert units[i, width] == 0x0080
+            assert blocks[i, 14] == width * 16
+            assert _hex(state[i]) == ntlm_hash(word), word
+        offset += size
+
+def test_candidate_at_round_trips_encode_batch_for_mask():
+    _assert_round_trip(build_segments('?u?l?d€?s'))
+
+def test_candidate_at_round_trips_encode_batch_for_hybrid():
+    words = ['summer', 'Ωmega', 'ab', '中文密码', '']
+    _assert_round_trip(build_segments('?d?d', words, mode='append'))
+    _assert_round_trip(build_segments('?s', words, mode='prepend'))
+
+def test_md4_blocks_is_deterministic_across_batches():
+    words = ['password', 'Password1', 'p' * MAX_BLOCK_UNITS]
+    together = md4_blocks(words_to_blocks(words))
+    apart = np.vstack([md4_blocks(words_to_blocks([w])) for w in words])
+    assert np.array_equal(together, apart)
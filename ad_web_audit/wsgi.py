@@ -0,0 +1,28 @@
+"""
+Production entry point for PassAudit Pro.
+
+Linux (multi-worker):
+    gunicorn -w 4 --threads 4 --timeout 3600 -b 0.0.0.0:8000 wsgi:application
+
+Windows / single process (multi-threaded):
+    python wsgi.py
+
+All workers share state through the SQLite store (STORE_PATH in config.py),
+so set the same PASSAUDIT_SECRET_KEY for every worker.
+"""
+
+import os
+
+# The app uses paths relative to this folder (static/, templates/, config paths)
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from app import app as application
+
+if __name__ == '__main__':
+    from waitress import serve
+
+    host = os.environ.get('PASSAUDIT_HOST', '0.0.0.0')
+    port = int(os.environ.get('PASSAUDIT_PORT', '8000'))
+    threads = int(os.environ.get('PASSAUDIT_THREADS', '8'))
+    print(f"🚀 Serving PassAudit Pro on http://{host}:{port} ({threads} threads)")
+    serve(application, host=host, port=port, threads=threads)